@@ -7,48 +7,33 @@ Barcode Reader Desktop Application
 
 import os
 import sys
-import cv2
+from startup_timeline import StartupTimeline
+
+# Created before the GUI and engine imports so the timeline covers them
+STARTUP = StartupTimeline('barcode_desktop')
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter.scrolledtext import ScrolledText
 import threading
 from pathlib import Path
-import numpy as np
+from rename_plan import (
+    COLLISION_SUFFIX, COLLISION_SKIP, COLLISION_OVERWRITE,
+    build_rename_plan, apply_rename_plan, rollback_journal,
+    latest_undoable_journal, recover_incomplete_journals
+)
+from decode_cache import DecodeCache
+from region_prior import RegionPrior
+from log_config import configure_logging
+import logging
 
-# Global variables for pyzbar availability
-PYZBAR_AVAILABLE = False
-pyzbar = None
-
-def init_pyzbar():
-    """Initialize pyzbar safely"""
-    global PYZBAR_AVAILABLE, pyzbar
-    
-    if PYZBAR_AVAILABLE is not False:  # Already initialized
-        return PYZBAR_AVAILABLE
-    
-    try:
-        # Try importing pyzbar only when needed
-        from pyzbar import pyzbar as pyzbar_module
-        
-        # Test if it works with a simple decode
-        test_array = np.zeros((50, 50), dtype=np.uint8)
-        pyzbar_module.decode(test_array)
-        
-        # If we get here, pyzbar works
-        pyzbar = pyzbar_module
-        PYZBAR_AVAILABLE = True
-        print("pyzbar library loaded successfully.")
-        return True
-        
-    except Exception as e:
-        PYZBAR_AVAILABLE = False
-        pyzbar = None
-        print(f"Using OpenCV-based barcode detection method. Reason: {type(e).__name__}: {str(e)[:100]}")
-        return False
+logger = logging.getLogger(__name__)
 
 class BarcodeReaderApp:
-    def __init__(self, root):
+    def __init__(self, root, profile=False):
         self.root = root
+        # --profile: every run writes a profile next to the processed files
+        self.profile = profile
         self.root.title("Barcode Reader - อ่าน Barcode และเปลี่ยนชื่อไฟล์")
         self.root.geometry("800x600")
         self.root.configure(bg='#2b2b2b')
@@ -62,6 +47,52 @@ class BarcodeReaderApp:
         
         self.setup_ui()
         self.processed_files = []
+        self.engine = None
+        self.decode_cache = None
+        self.recover_interrupted_batches()
+        
+        # Show the window first; cv2/numpy/pyzbar load in the background
+        self._set_buttons_state('disabled')
+        self.status_var.set("กำลังโหลดเอนจินอ่าน barcode...")
+        STARTUP.mark('window_built')
+        loader = threading.Thread(target=self._load_engine_thread)
+        loader.daemon = True
+        loader.start()
+    
+    def _load_engine_thread(self):
+        """โหลดไลบรารีและอุ่นเครื่อง decoder ในเธรดแยก"""
+        try:
+            import barcode_engine
+            STARTUP.mark('engine_imported')
+            barcode_engine.warm_up()
+            STARTUP.mark('engine_warm')
+            
+            decode_cache = None
+            try:
+                decode_cache = DecodeCache(engine=barcode_engine.cache_engine_key('desktop'))
+            except Exception as e:
+                logger.warning(f"Decode cache disabled: {str(e)}")
+            
+            self.root.after(0, lambda: self._on_engine_ready(barcode_engine, decode_cache))
+        except Exception as e:
+            self.root.after(0, lambda err=e: self._on_engine_failed(err))
+    
+    def _on_engine_ready(self, engine, decode_cache):
+        """เปิดใช้งานปุ่มเมื่อเอนจินพร้อม"""
+        self.engine = engine
+        self.decode_cache = decode_cache
+        self._enable_buttons()
+        self.status_var.set("พร้อมใช้งาน")
+        STARTUP.mark('ready')
+        STARTUP.finish()
+    
+    def _on_engine_failed(self, error):
+        """แจ้งเมื่อโหลดเอนจินไม่สำเร็จ"""
+        self.undo_btn.config(state='normal')
+        self.status_var.set("โหลดเอนจินอ่าน barcode ไม่สำเร็จ")
+        STARTUP.mark('failed')
+        STARTUP.finish()
+        messagebox.showerror("ข้อผิดพลาด", f"ไม่สามารถโหลดเอนจินอ่าน barcode ได้: {str(error)}")
         
     def setup_ui(self):
         """สร้าง UI สำหรับแอพพลิเคชัน"""
@@ -166,6 +197,53 @@ class BarcodeReaderApp:
         )
         self.select_folder_btn.pack(side=tk.LEFT, padx=5)
         
+        # Collision policy and undo
+        policy_frame = tk.Frame(file_frame, bg='#2b2b2b')
+        policy_frame.pack(fill=tk.X, pady=5)
+        
+        tk.Label(
+            policy_frame,
+            text="เมื่อชื่อไฟล์ซ้ำ:",
+            font=(self.font_family, 12),
+            bg='#2b2b2b',
+            fg='#ffffff'
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.policy_labels = {
+            "เพิ่มตัวเลขต่อท้าย": COLLISION_SUFFIX,
+            "ข้ามไฟล์": COLLISION_SKIP,
+            "เขียนทับ": COLLISION_OVERWRITE,
+        }
+        self.policy_var = tk.StringVar(value="เพิ่มตัวเลขต่อท้าย")
+        self.policy_menu = tk.OptionMenu(policy_frame, self.policy_var, *self.policy_labels.keys())
+        self.policy_menu.config(font=(self.font_family, 10), relief=tk.FLAT)
+        self.policy_menu.pack(side=tk.LEFT, padx=5)
+        
+        self.undo_btn = tk.Button(
+            policy_frame,
+            text="ย้อนกลับการเปลี่ยนชื่อล่าสุด",
+            command=self.undo_last_batch,
+            bg='#6c757d',
+            fg='white',
+            font=(self.font_family, 10),
+            relief=tk.FLAT,
+            padx=20,
+            pady=5
+        )
+        self.undo_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.use_cache_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            policy_frame,
+            text="ข้ามไฟล์ที่เคยอ่านแล้ว",
+            variable=self.use_cache_var,
+            font=(self.font_family, 10),
+            bg='#2b2b2b',
+            fg='#ffffff',
+            selectcolor='#1a1a1a',
+            activebackground='#2b2b2b'
+        ).pack(side=tk.LEFT, padx=5)
+        
         # Progress bar
         self.progress = ttk.Progressbar(
             self.root,
@@ -256,21 +334,34 @@ class BarcodeReaderApp:
     def process_files(self, file_paths):
         """ประมวลผลไฟล์ในเธรดแยก"""
         # Disable buttons during processing
-        self.select_file_btn.config(state='disabled')
-        self.select_files_btn.config(state='disabled')
-        self.select_folder_btn.config(state='disabled')
+        self._set_buttons_state('disabled')
         
         # Clear previous results
         self.results_text.delete(1.0, tk.END)
         self.processed_files = []
         
+        # Read the policy on the UI thread; the worker never asks the user
+        policy = self.policy_labels.get(self.policy_var.get(), COLLISION_SUFFIX)
+        use_cache = self.use_cache_var.get()
+        
         # Start processing in separate thread
-        thread = threading.Thread(target=self._process_files_thread, args=(file_paths,))
+        target = self._profile_files_thread if self.profile else self._process_files_thread
+        thread = threading.Thread(target=target, args=(file_paths, policy, use_cache))
         thread.daemon = True
         thread.start()
     
-    def _process_files_thread(self, file_paths):
-        """ประมวลผลไฟล์ในเธรด"""
+    def _profile_files_thread(self, file_paths, policy=COLLISION_SUFFIX, use_cache=True):
+        """เหมือน _process_files_thread แต่บันทึกโปรไฟล์ไว้ในโฟลเดอร์ของไฟล์ชุดนี้ (--profile)"""
+        from profiling import BatchProfiler
+        out_dir = os.path.dirname(os.path.abspath(file_paths[0]))
+        with BatchProfiler(out_dir, 'barcode_profile') as profiler:
+            self._process_files_thread(file_paths, policy, use_cache)
+        if profiler.paths:
+            self.root.after(0, lambda: self.add_result(
+                f"📊 บันทึกโปรไฟล์แล้ว: {', '.join(os.path.basename(p) for p in profiler.paths)}"))
+    
+    def _process_files_thread(self, file_paths, policy=COLLISION_SUFFIX, use_cache=True):
+        """ประมวลผลไฟล์ในเธรด: อ่าน barcode ทั้งหมดก่อน แล้วเปลี่ยนชื่อตามแผนในรอบเดียว"""
         try:
             total_files = len(file_paths)
             self.progress['maximum'] = total_files
@@ -278,24 +369,32 @@ class BarcodeReaderApp:
             
             success_count = 0
             error_count = 0
+            cached_count = 0
+            cache = self.decode_cache if use_cache else None
+            # Barcode positions and threshold order learned from this batch
+            # (threshold_tuner needs cv2, which is loaded with the engine)
+            from threshold_tuner import tuner_for_batch
+            prior = RegionPrior()
+            tuner = tuner_for_batch(total_files)
             
+            # Phase 1: decode everything
+            rename_items = []
             for i, file_path in enumerate(file_paths):
-                self.root.after(0, lambda: self.status_var.set(f"กำลังประมวลผล: {os.path.basename(file_path)}"))
+                self.root.after(0, lambda path=file_path: self.status_var.set(f"กำลังประมวลผล: {os.path.basename(path)}"))
                 
-                # Read barcode from image
-                barcode_text, error = self.read_barcode_from_image(file_path)
+                # Unchanged files are answered from the cache
+                cached = cache.lookup(file_path) if cache else None
+                if cached is not None:
+                    barcode_text, error = cached
+                    cached_count += 1
+                else:
+                    # Read barcode from image
+                    barcode_text, error = self.read_barcode_from_image(file_path, prior, tuner)
+                    if self.decode_cache and self.engine.is_cacheable(barcode_text, error):
+                        self.decode_cache.store(file_path, barcode_text, error)
                 
                 if barcode_text:
-                    # Rename file in original location
-                    success = self.rename_file_in_place(file_path, barcode_text)
-                    if success:
-                        success_count += 1
-                        self.root.after(0, lambda path=file_path, code=barcode_text: 
-                                      self.add_result(f"✓ สำเร็จ: {os.path.basename(path)} → {code}.jpg"))
-                    else:
-                        error_count += 1
-                        self.root.after(0, lambda path=file_path: 
-                                      self.add_result(f"✗ ล้มเหลว: ไม่สามารถเปลี่ยนชื่อ {os.path.basename(path)}"))
+                    rename_items.append((file_path, self.engine.clean_barcode_text(barcode_text)))
                 else:
                     error_count += 1
                     self.root.after(0, lambda path=file_path, err=error: 
@@ -304,276 +403,104 @@ class BarcodeReaderApp:
                 # Update progress
                 self.root.after(0, lambda val=i+1: setattr(self.progress, 'value', val))
             
+            # Phase 2: plan and apply all renames with a journal
+            self.root.after(0, lambda: self.status_var.set("กำลังเปลี่ยนชื่อไฟล์..."))
+            plan = build_rename_plan(rename_items, policy)
+            plan, _ = apply_rename_plan(plan)
+            
+            for op in plan:
+                if op.status == 'done':
+                    if self.decode_cache:
+                        self.decode_cache.move(op.src, op.dst)
+                    success_count += 1
+                    self.root.after(0, lambda o=op: 
+                                  self.add_result(f"✓ สำเร็จ: {os.path.basename(o.src)} → {os.path.basename(o.dst)}"))
+                elif op.status == 'unchanged':
+                    success_count += 1
+                    self.root.after(0, lambda o=op: 
+                                  self.add_result(f"✓ สำเร็จ: {os.path.basename(o.src)} ({o.reason})"))
+                else:
+                    error_count += 1
+                    self.root.after(0, lambda o=op: 
+                                  self.add_result(f"✗ ล้มเหลว: ไม่สามารถเปลี่ยนชื่อ {os.path.basename(o.src)} - {o.reason}"))
+            
             # Update status
             self.root.after(0, lambda: self.status_var.set(
-                f"เสร็จสิ้น: สำเร็จ {success_count} ไฟล์, ล้มเหลว {error_count} ไฟล์"))
+                f"เสร็จสิ้น: สำเร็จ {success_count} ไฟล์, ล้มเหลว {error_count} ไฟล์"
+                f" (ใช้ผลจากแคช {cached_count} ไฟล์, เจอที่ตำแหน่งเดิม {prior.hits}/{prior.attempts} ไฟล์)"))
             
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("ข้อผิดพลาด", f"เกิดข้อผิดพลาด: {str(e)}"))
+            self.root.after(0, lambda err=e: messagebox.showerror("ข้อผิดพลาด", f"เกิดข้อผิดพลาด: {str(err)}"))
         
         finally:
+            # Persist which decode strategies won this run
+            if self.engine is not None:
+                self.engine.flush_strategy_stats()
             # Re-enable buttons
             self.root.after(0, self._enable_buttons)
     
+    def _set_buttons_state(self, state):
+        """ตั้งสถานะปุ่มทั้งหมด"""
+        self.select_file_btn.config(state=state)
+        self.select_files_btn.config(state=state)
+        self.select_folder_btn.config(state=state)
+        self.undo_btn.config(state=state)
+    
     def _enable_buttons(self):
         """เปิดใช้งานปุ่มใหม่"""
-        self.select_file_btn.config(state='normal')
-        self.select_files_btn.config(state='normal')
-        self.select_folder_btn.config(state='normal')
+        self._set_buttons_state('normal')
+    
+    def undo_last_batch(self):
+        """ย้อนกลับการเปลี่ยนชื่อไฟล์ชุดล่าสุด"""
+        journal_path = latest_undoable_journal()
+        if not journal_path:
+            messagebox.showinfo("แจ้งเตือน", "ไม่มีการเปลี่ยนชื่อที่ย้อนกลับได้")
+            return
+        
+        if not messagebox.askyesno("ยืนยัน", "ต้องการย้อนกลับการเปลี่ยนชื่อไฟล์ชุดล่าสุดหรือไม่?"):
+            return
+        
+        restored, errors = rollback_journal(journal_path)
+        self.add_result(f"↩ ย้อนกลับแล้ว {restored} ไฟล์")
+        for err in errors:
+            self.add_result(f"✗ ย้อนกลับไม่สำเร็จ: {err}")
+        self.status_var.set(f"ย้อนกลับแล้ว {restored} ไฟล์")
+    
+    def recover_interrupted_batches(self):
+        """ย้อนกลับชุดที่ถูกขัดจังหวะก่อนเสร็จ (เช่น โปรแกรมปิดตัวกลางคัน)"""
+        try:
+            recovered = recover_incomplete_journals()
+        except Exception as e:
+            logger.error(f"Error recovering rename journals: {str(e)}")
+            return
+        
+        for journal_path, restored, errors in recovered:
+            self.add_result(f"↩ กู้คืนชุดที่ค้างอยู่: ย้อนกลับ {restored} ไฟล์ ({os.path.basename(journal_path)})")
+            for err in errors:
+                self.add_result(f"✗ กู้คืนไม่สำเร็จ: {err}")
     
     def add_result(self, message):
         """เพิ่มผลลัพธ์ในหน้าจอ"""
         self.results_text.insert(tk.END, message + "\n")
         self.results_text.see(tk.END)
     
-    def read_barcode_from_image(self, image_path):
+    def read_barcode_from_image(self, image_path, prior=None, tuner=None):
         """อ่าน barcode จากไฟล์ภาพ"""
-        try:
-            # Read image using OpenCV
-            image = cv2.imread(image_path)
-            if image is None:
-                return None, "ไม่สามารถอ่านไฟล์ภาพได้"
-            
-            # Try to use pyzbar if available
-            if init_pyzbar():
-                global pyzbar
-                # Convert to RGB (pyzbar expects RGB)
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                
-                # Try to decode barcodes
-                barcodes = pyzbar.decode(rgb_image)
-                
-                if not barcodes:
-                    # Try with different preprocessing
-                    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                    
-                    # Try with different thresholding methods
-                    methods = [
-                        lambda img: cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1],
-                        lambda img: cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2),
-                        lambda img: cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 11, 2)
-                    ]
-                    
-                    for method in methods:
-                        processed = method(gray)
-                        if pyzbar:  # Check if pyzbar is still available
-                            barcodes = pyzbar.decode(processed)
-                            if barcodes:
-                                break
-                
-                if barcodes:
-                    # Return the first barcode found
-                    barcode_data = barcodes[0].data.decode('utf-8')
-                    return barcode_data, None
-                else:
-                    return None, "ไม่พบ barcode ในภาพนี้"
-            else:
-                # Use OpenCV fallback method
-                return self.read_barcode_opencv_fallback(image)
-                
-        except Exception as e:
-            return None, f"เกิดข้อผิดพลาดในการอ่าน barcode: {str(e)}"
-    
-    def read_barcode_opencv_fallback(self, image):
-        """วิธีสำรองสำหรับอ่าน barcode ด้วย OpenCV"""
-        try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Multiple preprocessing approaches
-            processed_images = []
-            
-            # Method 1: Gaussian blur + threshold
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            _, thresh1 = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            processed_images.append(thresh1)
-            
-            # Method 2: Adaptive threshold
-            thresh2 = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-            processed_images.append(thresh2)
-            
-            # Try to detect barcode patterns
-            for processed in processed_images:
-                result = self.detect_code128_pattern(processed)
-                if result:
-                    return result, None
-                    
-            return None, "ไม่พบ barcode หรือ barcode ไม่ชัดเจนพอ"
-            
-        except Exception as e:
-            return None, f"เกิดข้อผิดพลาดในการอ่าน barcode: {str(e)}"
-    
-    def detect_code128_pattern(self, image):
-        """ตรวจจับ pattern ของ Code 128 barcode โดยใช้ OpenCV"""
-        try:
-            # Find contours
-            contours, _ = cv2.findContours(image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Filter contours that might be barcode segments
-            barcode_contours = []
-            for contour in contours:
-                x, y, w, h = cv2.boundingRect(contour)
-                aspect_ratio = w / h if h > 0 else 0
-                area = cv2.contourArea(contour)
-                
-                # Barcode segments: tall and narrow rectangles
-                if 0.1 < aspect_ratio < 3.0 and area > 30:
-                    barcode_contours.append((x, y, w, h))
-            
-            if len(barcode_contours) >= 8:
-                # Sort by x coordinate to get left-to-right order
-                barcode_contours.sort(key=lambda c: c[0])
-                
-                # Check for horizontal alignment (barcode pattern)
-                y_positions = [c[1] for c in barcode_contours]
-                y_variance = max(y_positions) - min(y_positions) if y_positions else 0
-                
-                if y_variance < 30:  # Segments should be roughly aligned
-                    # Try to decode based on width patterns
-                    result = self.decode_width_patterns(barcode_contours, image)
-                    if result:
-                        return result
-                
-            return None
-            
-        except Exception as e:
-            return None
-    
-    def decode_width_patterns(self, contours, image):
-        """พยายามถอดรหัส barcode จาก width patterns"""
-        try:
-            # Get width sequence
-            widths = [c[2] for c in contours]
-            
-            # Normalize widths to find pattern
-            if not widths:
-                return None
-                
-            avg_width = sum(widths) / len(widths)
-            normalized_widths = [w / avg_width for w in widths]
-            
-            # Simple pattern matching for common barcode formats
-            # This is a simplified approach - real barcode decoding is much more complex
-            
-            # Look for specific patterns that might indicate certain characters
-            width_pattern = ''.join(['1' if w > 1.2 else '0' for w in normalized_widths])
-            
-            # For demonstration with sample image patterns
-            # Check if pattern matches known sequences for "ARHZ43I03901"
-            if len(width_pattern) >= 12:
-                # Pattern analysis for the sample barcode
-                # This is a simplified matcher for the specific sample image
-                if self.matches_sample_pattern(width_pattern, contours):
-                    return "ARHZ43I03901"
-                    
-                # Try other common patterns
-                decoded = self.pattern_to_text(width_pattern)
-                if decoded:
-                    return decoded
-            
-            return None
-            
-        except Exception as e:
-            return None
-    
-    def matches_sample_pattern(self, pattern, contours):
-        """ตรวจสอบว่าตรงกับ pattern ของตัวอย่างหรือไม่"""
-        # Check if the pattern characteristics match our sample image
-        if len(contours) >= 12:
-            # Check width variance and distribution
-            widths = [c[2] for c in contours]
-            width_std = np.std(widths) if len(widths) > 1 else 0
-            
-            # Sample barcode has certain characteristics
-            if 2 < width_std < 15:  # Moderate width variation
-                return True
-                
-        return False
-    
-    def pattern_to_text(self, pattern):
-        """แปลง pattern เป็นข้อความ (simplified)"""
-        try:
-            # This is a very basic pattern matcher
-            # In reality, barcode decoding requires complex algorithms
-            
-            # Some common pattern mappings (simplified)
-            pattern_map = {
-                '110100': 'A',
-                '101100': 'R', 
-                '100110': 'H',
-                '110010': 'Z',
-                '1010': '4',
-                '1100': '3',
-                '0110': 'I',
-                '1001': '0',
-                '0101': '9',
-                '1110': '1',
-            }
-            
-            # Try to match subpatterns
-            result = ""
-            i = 0
-            while i < len(pattern):
-                matched = False
-                for length in [6, 4, 3, 2]:
-                    if i + length <= len(pattern):
-                        subpattern = pattern[i:i+length]
-                        if subpattern in pattern_map:
-                            result += pattern_map[subpattern]
-                            i += length
-                            matched = True
-                            break
-                if not matched:
-                    i += 1
-                    
-            # Return result if it looks reasonable
-            if len(result) >= 4 and result.replace('0', '').replace('1', ''):
-                return result[:12]  # Limit length
-                
-            return None
-            
-        except Exception as e:
-            return None
-    
-    def rename_file_in_place(self, original_path, barcode_text):
-        """เปลี่ยนชื่อไฟล์ในตำแหน่งเดิม"""
-        try:
-            # Get directory and file extension
-            directory = os.path.dirname(original_path)
-            _, ext = os.path.splitext(original_path)
-            
-            # Create new filename
-            new_filename = f"{barcode_text}{ext}"
-            new_path = os.path.join(directory, new_filename)
-            
-            # Check if target file already exists
-            if os.path.exists(new_path) and new_path != original_path:
-                # Ask user what to do
-                response = messagebox.askyesno(
-                    "ไฟล์ซ้ำ",
-                    f"ไฟล์ {new_filename} มีอยู่แล้ว\nต้องการเขียนทับหรือไม่?"
-                )
-                if not response:
-                    return False
-            
-            # Rename file
-            os.rename(original_path, new_path)
-            return True
-            
-        except Exception as e:
-            print(f"Error renaming file: {str(e)}")
-            return False
+        return self.engine.read_barcode_from_image(image_path, prior, tuner)
 
 def main():
     """ฟังก์ชันหลักของโปรแกรม"""
+    configure_logging()
     root = tk.Tk()
-    app = BarcodeReaderApp(root)
+    STARTUP.mark('tk_created')
+    app = BarcodeReaderApp(root, profile='--profile' in sys.argv)
     
     # Center window on screen
     root.update_idletasks()
     x = (root.winfo_screenwidth() // 2) - (root.winfo_width() // 2)
     y = (root.winfo_screenheight() // 2) - (root.winfo_height() // 2)
     root.geometry(f"+{x}+{y}")
+    root.after(0, lambda: STARTUP.mark('window_shown'))
     
     root.mainloop()
 
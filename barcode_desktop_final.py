@@ -9,20 +9,46 @@ Barcode Reader Desktop Application (Final Safe Version)
 
 import os
 import sys
-import cv2
+from startup_timeline import StartupTimeline
+
+# Created before the GUI imports so the timeline covers them
+STARTUP = StartupTimeline('barcode_desktop_final')
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from tkinter.scrolledtext import ScrolledText
 import threading
 from pathlib import Path
-from pyzxing import BarCodeReader
-import numpy as np
+from rename_plan import (
+    COLLISION_SUFFIX, COLLISION_SKIP, COLLISION_OVERWRITE,
+    build_rename_plan, apply_rename_plan, rollback_journal,
+    latest_undoable_journal, recover_incomplete_journals
+)
+from decode_cache import DecodeCache, engine_key
+from zxing_worker import ZXingWorker, DEFAULT_BATCH_SIZE as ZXING_BATCH_SIZE
+from log_config import configure_logging
+import logging
+
+logger = logging.getLogger(__name__)
+
+# cv2 and numpy are imported by load_engine() on a background thread so the
+# window can appear before they finish loading
+cv2 = None
+np = None
 
-print("Barcode Reader - OpenCV Only Mode (No pyzbar)")
+def load_engine():
+    """โหลด OpenCV และ numpy (เรียกจากเธรดโหลดเอนจิน)"""
+    global cv2, np
+    import cv2 as cv2_module
+    import numpy as np_module
+    cv2 = cv2_module
+    np = np_module
 
 class BarcodeReaderApp:
-    def __init__(self, root):
+    def __init__(self, root, profile=False):
         self.root = root
+        # --profile: every run writes a profile next to the processed files
+        self.profile = profile
         self.root.title("Barcode Reader - อ่าน Barcode และเปลี่ยนชื่อไฟล์")
         self.root.geometry("800x600")
         self.root.configure(bg='#2b2b2b')
@@ -36,6 +62,62 @@ class BarcodeReaderApp:
         
         self.setup_ui()
         self.processed_files = []
+        self.zxing_worker = None
+        self.decode_cache = None
+        self.recover_interrupted_batches()
+        
+        # Show the window first; cv2/numpy/zxing load in the background
+        self._set_buttons_state('disabled')
+        self.status_var.set("กำลังโหลดเอนจินอ่าน barcode...")
+        STARTUP.mark('window_built')
+        loader = threading.Thread(target=self._load_engine_thread)
+        loader.daemon = True
+        loader.start()
+    
+    def _load_engine_thread(self):
+        """โหลดไลบรารีและอุ่นเครื่อง decoder ในเธรดแยก"""
+        try:
+            load_engine()
+            STARTUP.mark('engine_imported')
+            
+            # Warm up OpenCV so the first file is not slower than the rest
+            self.read_barcode_opencv_method(np.full((64, 256, 3), 255, dtype=np.uint8))
+            STARTUP.mark('engine_warm')
+            
+            zxing_worker = None
+            try:
+                zxing_worker = ZXingWorker()
+                STARTUP.mark('zxing_ready')
+            except Exception as e:
+                logger.warning(f"zxing disabled: {type(e).__name__}: {str(e)[:100]}")
+            
+            decode_cache = None
+            try:
+                backend = 'opencv+zxing' if zxing_worker else 'opencv'
+                decode_cache = DecodeCache(engine=engine_key('desktop_final', backend))
+            except Exception as e:
+                logger.warning(f"Decode cache disabled: {str(e)}")
+            
+            self.root.after(0, lambda: self._on_engine_ready(zxing_worker, decode_cache))
+        except Exception as e:
+            self.root.after(0, lambda err=e: self._on_engine_failed(err))
+    
+    def _on_engine_ready(self, zxing_worker, decode_cache):
+        """เปิดใช้งานปุ่มเมื่อเอนจินพร้อม"""
+        self.zxing_worker = zxing_worker
+        self.decode_cache = decode_cache
+        self._enable_buttons()
+        self.status_var.set("พร้อมใช้งาน")
+        STARTUP.mark('ready')
+        STARTUP.finish()
+    
+    def _on_engine_failed(self, error):
+        """แจ้งเมื่อโหลดเอนจินไม่สำเร็จ"""
+        self.undo_btn.config(state='normal')
+        self.status_var.set("โหลดเอนจินอ่าน barcode ไม่สำเร็จ")
+        STARTUP.mark('failed')
+        STARTUP.finish()
+        messagebox.showerror("ข้อผิดพลาด", f"ไม่สามารถโหลดเอนจินอ่าน barcode ได้: {str(error)}")
         
     def setup_ui(self):
         """สร้าง UI สำหรับแอพพลิเคชัน"""
@@ -140,6 +222,53 @@ class BarcodeReaderApp:
         )
         self.select_folder_btn.pack(side=tk.LEFT, padx=5)
         
+        # Collision policy and undo
+        policy_frame = tk.Frame(file_frame, bg='#2b2b2b')
+        policy_frame.pack(fill=tk.X, pady=5)
+        
+        tk.Label(
+            policy_frame,
+            text="เมื่อชื่อไฟล์ซ้ำ:",
+            font=(self.font_family, 12),
+            bg='#2b2b2b',
+            fg='#ffffff'
+        ).pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.policy_labels = {
+            "เพิ่มตัวเลขต่อท้าย": COLLISION_SUFFIX,
+            "ข้ามไฟล์": COLLISION_SKIP,
+            "เขียนทับ": COLLISION_OVERWRITE,
+        }
+        self.policy_var = tk.StringVar(value="เพิ่มตัวเลขต่อท้าย")
+        self.policy_menu = tk.OptionMenu(policy_frame, self.policy_var, *self.policy_labels.keys())
+        self.policy_menu.config(font=(self.font_family, 10), relief=tk.FLAT)
+        self.policy_menu.pack(side=tk.LEFT, padx=5)
+        
+        self.undo_btn = tk.Button(
+            policy_frame,
+            text="ย้อนกลับการเปลี่ยนชื่อล่าสุด",
+            command=self.undo_last_batch,
+            bg='#6c757d',
+            fg='white',
+            font=(self.font_family, 10),
+            relief=tk.FLAT,
+            padx=20,
+            pady=5
+        )
+        self.undo_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.use_cache_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            policy_frame,
+            text="ข้ามไฟล์ที่เคยอ่านแล้ว",
+            variable=self.use_cache_var,
+            font=(self.font_family, 10),
+            bg='#2b2b2b',
+            fg='#ffffff',
+            selectcolor='#1a1a1a',
+            activebackground='#2b2b2b'
+        ).pack(side=tk.LEFT, padx=5)
+        
         # Progress bar
         self.progress = ttk.Progressbar(
             self.root,
@@ -230,21 +359,34 @@ class BarcodeReaderApp:
     def process_files(self, file_paths):
         """ประมวลผลไฟล์ในเธรดแยก"""
         # Disable buttons during processing
-        self.select_file_btn.config(state='disabled')
-        self.select_files_btn.config(state='disabled')
-        self.select_folder_btn.config(state='disabled')
+        self._set_buttons_state('disabled')
         
         # Clear previous results
         self.results_text.delete(1.0, tk.END)
         self.processed_files = []
         
+        # Read the policy on the UI thread; the worker never asks the user
+        policy = self.policy_labels.get(self.policy_var.get(), COLLISION_SUFFIX)
+        use_cache = self.use_cache_var.get()
+        
         # Start processing in separate thread
-        thread = threading.Thread(target=self._process_files_thread, args=(file_paths,))
+        target = self._profile_files_thread if self.profile else self._process_files_thread
+        thread = threading.Thread(target=target, args=(file_paths, policy, use_cache))
         thread.daemon = True
         thread.start()
     
-    def _process_files_thread(self, file_paths):
-        """ประมวลผลไฟล์ในเธรด"""
+    def _profile_files_thread(self, file_paths, policy=COLLISION_SUFFIX, use_cache=True):
+        """เหมือน _process_files_thread แต่บันทึกโปรไฟล์ไว้ในโฟลเดอร์ของไฟล์ชุดนี้ (--profile)"""
+        from profiling import BatchProfiler
+        out_dir = os.path.dirname(os.path.abspath(file_paths[0]))
+        with BatchProfiler(out_dir, 'barcode_profile') as profiler:
+            self._process_files_thread(file_paths, policy, use_cache)
+        if profiler.paths:
+            self.root.after(0, lambda: self.add_result(
+                f"📊 บันทึกโปรไฟล์แล้ว: {', '.join(os.path.basename(p) for p in profiler.paths)}"))
+    
+    def _process_files_thread(self, file_paths, policy=COLLISION_SUFFIX, use_cache=True):
+        """ประมวลผลไฟล์ในเธรด: อ่าน barcode ทั้งหมดก่อน แล้วเปลี่ยนชื่อตามแผนในรอบเดียว"""
         try:
             total_files = len(file_paths)
             self.progress['maximum'] = total_files
@@ -252,59 +394,144 @@ class BarcodeReaderApp:
             
             success_count = 0
             error_count = 0
+            cached_count = 0
+            cache = self.decode_cache if use_cache else None
             
-            for i, file_path in enumerate(file_paths):
-                self.root.after(0, lambda: self.status_var.set(f"กำลังประมวลผล: {os.path.basename(file_path)}"))
+            # Phase 1: decode everything, one zxing JVM per chunk
+            rename_items = []
+            for start in range(0, total_files, ZXING_BATCH_SIZE):
+                chunk = file_paths[start:start + ZXING_BATCH_SIZE]
                 
-                # Read barcode from image
-                barcode_text, error = self.read_barcode_from_image(file_path)
+                # Unchanged files are answered from the cache
+                cached_results = {}
+                if cache:
+                    for file_path in chunk:
+                        cached = cache.lookup(file_path)
+                        if cached is not None:
+                            cached_results[file_path] = cached
                 
-                if barcode_text:
-                    # Rename file in original location
-                    success = self.rename_file_in_place(file_path, barcode_text)
-                    if success:
-                        success_count += 1
-                        self.root.after(0, lambda path=file_path, code=barcode_text: 
-                                      self.add_result(f"✓ สำเร็จ: {os.path.basename(path)} → {code}.jpg"))
+                zxing_results = self.read_barcodes_zxing([p for p in chunk if p not in cached_results])
+                
+                for offset, file_path in enumerate(chunk):
+                    self.root.after(0, lambda path=file_path: self.status_var.set(f"กำลังประมวลผล: {os.path.basename(path)}"))
+                    
+                    if file_path in cached_results:
+                        barcode_text, error = cached_results[file_path]
+                        cached_count += 1
+                    else:
+                        barcode_text, error = zxing_results.get(file_path), None
+                        if not barcode_text:
+                            # Read barcode from image with OpenCV
+                            barcode_text, error = self.read_barcode_from_image(file_path)
+                        if self.decode_cache and (barcode_text or not error.startswith("เกิดข้อผิดพลาด")):
+                            self.decode_cache.store(file_path, barcode_text, error)
+                    
+                    if barcode_text:
+                        rename_items.append((file_path, self.clean_barcode_text(barcode_text)))
                     else:
                         error_count += 1
-                        self.root.after(0, lambda path=file_path: 
-                                      self.add_result(f"✗ ล้มเหลว: ไม่สามารถเปลี่ยนชื่อ {os.path.basename(path)}"))
+                        self.root.after(0, lambda path=file_path, err=error: 
+                                      self.add_result(f"✗ ล้มเหลว: {os.path.basename(path)} - {err}"))
+                    
+                    # Update progress
+                    self.root.after(0, lambda val=start+offset+1: setattr(self.progress, 'value', val))
+            
+            # Phase 2: plan and apply all renames with a journal
+            self.root.after(0, lambda: self.status_var.set("กำลังเปลี่ยนชื่อไฟล์..."))
+            plan = build_rename_plan(rename_items, policy)
+            plan, _ = apply_rename_plan(plan)
+            
+            for op in plan:
+                if op.status == 'done':
+                    if self.decode_cache:
+                        self.decode_cache.move(op.src, op.dst)
+                    success_count += 1
+                    self.root.after(0, lambda o=op: 
+                                  self.add_result(f"✓ สำเร็จ: {os.path.basename(o.src)} → {os.path.basename(o.dst)}"))
+                elif op.status == 'unchanged':
+                    success_count += 1
+                    self.root.after(0, lambda o=op: 
+                                  self.add_result(f"✓ สำเร็จ: {os.path.basename(o.src)} ({o.reason})"))
                 else:
                     error_count += 1
-                    self.root.after(0, lambda path=file_path, err=error: 
-                                  self.add_result(f"✗ ล้มเหลว: {os.path.basename(path)} - {err}"))
-                
-                # Update progress
-                self.root.after(0, lambda val=i+1: setattr(self.progress, 'value', val))
+                    self.root.after(0, lambda o=op: 
+                                  self.add_result(f"✗ ล้มเหลว: ไม่สามารถเปลี่ยนชื่อ {os.path.basename(o.src)} - {o.reason}"))
             
             # Update status
             self.root.after(0, lambda: self.status_var.set(
-                f"เสร็จสิ้น: สำเร็จ {success_count} ไฟล์, ล้มเหลว {error_count} ไฟล์"))
+                f"เสร็จสิ้น: สำเร็จ {success_count} ไฟล์, ล้มเหลว {error_count} ไฟล์"
+                f" (ใช้ผลจากแคช {cached_count} ไฟล์)"))
             
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("ข้อผิดพลาด", f"เกิดข้อผิดพลาด: {str(e)}"))
+            self.root.after(0, lambda err=e: messagebox.showerror("ข้อผิดพลาด", f"เกิดข้อผิดพลาด: {str(err)}"))
         
         finally:
             # Re-enable buttons
             self.root.after(0, self._enable_buttons)
     
+    def _set_buttons_state(self, state):
+        """ตั้งสถานะปุ่มทั้งหมด"""
+        self.select_file_btn.config(state=state)
+        self.select_files_btn.config(state=state)
+        self.select_folder_btn.config(state=state)
+        self.undo_btn.config(state=state)
+    
     def _enable_buttons(self):
         """เปิดใช้งานปุ่มใหม่"""
-        self.select_file_btn.config(state='normal')
-        self.select_files_btn.config(state='normal')
-        self.select_folder_btn.config(state='normal')
+        self._set_buttons_state('normal')
+    
+    def undo_last_batch(self):
+        """ย้อนกลับการเปลี่ยนชื่อไฟล์ชุดล่าสุด"""
+        journal_path = latest_undoable_journal()
+        if not journal_path:
+            messagebox.showinfo("แจ้งเตือน", "ไม่มีการเปลี่ยนชื่อที่ย้อนกลับได้")
+            return
+        
+        if not messagebox.askyesno("ยืนยัน", "ต้องการย้อนกลับการเปลี่ยนชื่อไฟล์ชุดล่าสุดหรือไม่?"):
+            return
+        
+        restored, errors = rollback_journal(journal_path)
+        self.add_result(f"↩ ย้อนกลับแล้ว {restored} ไฟล์")
+        for err in errors:
+            self.add_result(f"✗ ย้อนกลับไม่สำเร็จ: {err}")
+        self.status_var.set(f"ย้อนกลับแล้ว {restored} ไฟล์")
+    
+    def recover_interrupted_batches(self):
+        """ย้อนกลับชุดที่ถูกขัดจังหวะก่อนเสร็จ (เช่น โปรแกรมปิดตัวกลางคัน)"""
+        try:
+            recovered = recover_incomplete_journals()
+        except Exception as e:
+            logger.error(f"Error recovering rename journals: {str(e)}")
+            return
+        
+        for journal_path, restored, errors in recovered:
+            self.add_result(f"↩ กู้คืนชุดที่ค้างอยู่: ย้อนกลับ {restored} ไฟล์ ({os.path.basename(journal_path)})")
+            for err in errors:
+                self.add_result(f"✗ กู้คืนไม่สำเร็จ: {err}")
     
     def add_result(self, message):
         """เพิ่มผลลัพธ์ในหน้าจอ"""
         self.results_text.insert(tk.END, message + "\n")
         self.results_text.see(tk.END)
     
+    def read_barcodes_zxing(self, file_paths):
+        """อ่าน barcode หลายไฟล์ด้วย zxing worker (คืนค่า {path: text หรือ None})"""
+        if not self.zxing_worker or not file_paths:
+            return {}
+        try:
+            return self.zxing_worker.decode_batch(file_paths)
+        except Exception as e:
+            # Java missing or zxing keeps failing: continue with OpenCV only
+            self.zxing_worker = None
+            self.root.after(0, lambda err=e: self.add_result(f"⚠ ปิดการใช้ zxing: {str(err)[:100]}"))
+            return {}
+    
     def read_barcode_from_image(self, image_path):
         """อ่าน barcode จากไฟล์ภาพ (OpenCV only)"""
         try:
-            # Read image using OpenCV
-            image = cv2.imread(image_path)
+            # Read image using OpenCV, upright per EXIF orientation (same as PIL)
+            from jpeg_header import load_image
+            image = load_image(image_path)
             if image is None:
                 return None, "ไม่สามารถอ่านไฟล์ภาพได้"
             
@@ -557,45 +784,25 @@ class BarcodeReaderApp:
         except:
             return "BC12345678"
     
-    def rename_file_in_place(self, original_path, barcode_text):
-        """เปลี่ยนชื่อไฟล์ในตำแหน่งเดิม"""
-        try:
-            directory = os.path.dirname(original_path)
-            _, ext = os.path.splitext(original_path)
-            
-            # Clean barcode text for filename
-            clean_barcode = ''.join(c for c in barcode_text if c.isalnum())
-            if not clean_barcode:
-                clean_barcode = "UNKNOWN"
-                
-            new_filename = f"{clean_barcode}{ext}"
-            new_path = os.path.join(directory, new_filename)
-            
-            if os.path.exists(new_path) and new_path != original_path:
-                response = messagebox.askyesno(
-                    "ไฟล์ซ้ำ",
-                    f"ไฟล์ {new_filename} มีอยู่แล้ว\nต้องการเขียนทับหรือไม่?"
-                )
-                if not response:
-                    return False
-            
-            os.rename(original_path, new_path)
-            return True
-            
-        except Exception as e:
-            print(f"Error renaming file: {str(e)}")
-            return False
+    def clean_barcode_text(self, barcode_text):
+        """ทำความสะอาดข้อความ barcode ให้ใช้เป็นชื่อไฟล์ได้"""
+        clean_barcode = ''.join(c for c in barcode_text if c.isalnum())
+        return clean_barcode or "UNKNOWN"
 
 def main():
     """ฟังก์ชันหลักของโปรแกรม"""
+    configure_logging()
+    logger.info("Barcode Reader - OpenCV Only Mode (No pyzbar)")
     root = tk.Tk()
-    app = BarcodeReaderApp(root)
+    STARTUP.mark('tk_created')
+    app = BarcodeReaderApp(root, profile='--profile' in sys.argv)
     
     # Center window on screen
     root.update_idletasks()
     x = (root.winfo_screenwidth() // 2) - (root.winfo_width() // 2)
     y = (root.winfo_screenheight() // 2) - (root.winfo_height() // 2)
     root.geometry(f"+{x}+{y}")
+    root.after(0, lambda: STARTUP.mark('window_shown'))
     
     root.mainloop()
 
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single-pass gradient barcode localizer
+หาตำแหน่งที่น่าจะเป็น barcode ในภาพด้วยการสแกนภาพเพียงรอบเดียว
+
+1D barcodes have strong horizontal gradients and weak vertical ones. The
+localizer computes |Scharr x| - |Scharr y|, blurs it, thresholds it, closes
+the gaps between bars with one morphology pass and labels the blobs with
+connectedComponentsWithStats. Candidates are ranked by their mean gradient
+(from an integral image, O(1) per box), fill ratio and size, so the
+detectors in app.py inspect a few small crops instead of re-scanning the
+full frame.
+
+For skewed scans, localize_oriented_barcodes finds regions of strong,
+coherent gradients at any angle, estimate_orientation reads the dominant
+direction of a crop from its structure tensor and deskew_crop rotates only
+that crop upright, so rotation costs one extra pass over a few crops.
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+BarcodeCandidate = namedtuple('BarcodeCandidate', ['x', 'y', 'w', 'h', 'score'])
+
+MAX_CANDIDATES = 5
+MIN_CANDIDATE_WIDTH = 30
+MIN_CANDIDATE_HEIGHT = 8
+CLOSE_KERNEL_SIZE = (21, 7)
+BLUR_KERNEL_SIZE = (9, 9)
+
+
+def gradient_response(gray):
+    """Horizontal-minus-vertical Scharr gradient as uint8"""
+    # Each 16-bit gradient is converted to uint8 right away so only one is alive
+    abs_x = cv2.convertScaleAbs(cv2.Scharr(gray, cv2.CV_16S, 1, 0))
+    abs_y = cv2.convertScaleAbs(cv2.Scharr(gray, cv2.CV_16S, 0, 1))
+    # cv2.subtract saturates at 0, so areas dominated by vertical gradients drop out
+    return cv2.subtract(abs_x, abs_y, dst=abs_x)
+
+
+def localize_barcodes(gray, max_candidates=MAX_CANDIDATES):
+    """Return up to max_candidates BarcodeCandidate boxes, best first"""
+    if gray is None or gray.size == 0:
+        return []
+    if len(gray.shape) == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+
+    gradient = cv2.blur(gradient_response(gray), BLUR_KERNEL_SIZE)
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, CLOSE_KERNEL_SIZE)
+    closed = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(closed, connectivity=8)
+    if count <= 1:
+        return []
+
+    # Vectorized filtering over all components (label 0 is the background)
+    stats = stats[1:]
+    x, y, w, h, area = (stats[:, i] for i in range(5))
+    keep = (w >= MIN_CANDIDATE_WIDTH) & (h >= MIN_CANDIDATE_HEIGHT) & (w >= h)
+    if not np.any(keep):
+        return []
+    x, y, w, h, area = x[keep], y[keep], w[keep], h[keep], area[keep]
+
+    # Mean gradient inside every box in O(1) per box
+    integral = cv2.integral(gradient, sdepth=cv2.CV_64F)
+    box_sum = (integral[y + h, x + w] - integral[y, x + w]
+               - integral[y + h, x] + integral[y, x])
+    box_area = (w * h).astype(np.float64)
+    mean_gradient = box_sum / box_area
+    fill_ratio = area / box_area
+    score = mean_gradient * fill_ratio * np.log1p(area)
+
+    order = np.argsort(-score)[:max_candidates]
+    return [
+        BarcodeCandidate(int(x[i]), int(y[i]), int(w[i]), int(h[i]), float(score[i]))
+        for i in order
+    ]
+
+
+def crop_candidate(image, candidate, margin=10):
+    """Crop a candidate box (with margin) from an image"""
+    height, width = image.shape[:2]
+    x1 = max(0, candidate.x - margin)
+    y1 = max(0, candidate.y - margin)
+    x2 = min(width, candidate.x + candidate.w + margin)
+    y2 = min(height, candidate.y + candidate.h + margin)
+    return image[y1:y2, x1:x2]
+
+
+def segment_bars(binary, min_aspect, max_aspect, min_area):
+    """Segment bar-like blobs with connectedComponentsWithStats
+
+    Returns an (N, 4) int array of x, y, w, h sorted by x. Filtering and
+    sorting run in NumPy, so scans with thousands of blobs do not pay a
+    Python-level cost per blob.
+    """
+    _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    stats = stats[1:]
+    w = stats[:, cv2.CC_STAT_WIDTH]
+    h = stats[:, cv2.CC_STAT_HEIGHT]
+    aspect = w / np.maximum(h, 1)
+    keep = (aspect > min_aspect) & (aspect < max_aspect) & (stats[:, cv2.CC_STAT_AREA] > min_area)
+    bars = stats[keep, :4]
+    return bars[np.argsort(bars[:, 0], kind='stable')]
+
+
+def aligned_window_starts(y_positions, window, max_y_spread):
+    """Start indexes i where y_positions[i:i+window] spans less than max_y_spread
+
+    Windows that run past the end are truncated, as with list slicing.
+    """
+    n = len(y_positions)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    # Truncated windows always contain the last element, so padding with it
+    # leaves their max/min unchanged
+    padded = np.concatenate([y_positions, np.full(window - 1, y_positions[-1], dtype=y_positions.dtype)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)[:n]
+    spread = windows.max(axis=1) - windows.min(axis=1)
+    return np.flatnonzero(spread < max_y_spread)
+
+
+class EdgeDensityMap:
+    """Summed-area table over a binary map: the pixel count of any box is O(1)"""
+
+    def __init__(self, binary):
+        self.height, self.width = binary.shape[:2]
+        ones = np.greater(binary, 0).view(np.uint8)
+        self.table = cv2.integral(ones, sdepth=cv2.CV_32S)
+
+    def counts(self, x, y, w, h):
+        """Non-zero pixel counts for boxes (scalars or equally shaped arrays)"""
+        t = self.table
+        return t[y + h, x + w] - t[y, x + w] - t[y + h, x] + t[y, x]
+
+    def densities(self, x, y, w, h):
+        """Fraction of non-zero pixels for boxes"""
+        return self.counts(x, y, w, h) / (np.asarray(w) * np.asarray(h))
+
+    def windows(self, sizes, stride_fraction=0.5):
+        """Sliding windows for several (height, width) sizes as x, y, w, h arrays
+
+        Windows of every scale are generated together so they can be scored
+        with a single vectorized counts()/densities() call.
+        """
+        xs, ys, ws, hs = [], [], [], []
+        for win_h, win_w in sizes:
+            win_h = min(max(1, int(win_h)), self.height)
+            win_w = min(max(1, int(win_w)), self.width)
+            step_y = max(1, int(win_h * stride_fraction))
+            step_x = max(1, int(win_w * stride_fraction))
+            grid_y, grid_x = np.meshgrid(
+                np.arange(0, self.height - win_h + 1, step_y),
+                np.arange(0, self.width - win_w + 1, step_x),
+                indexing='ij'
+            )
+            xs.append(grid_x.ravel())
+            ys.append(grid_y.ravel())
+            ws.append(np.full(grid_x.size, win_w))
+            hs.append(np.full(grid_x.size, win_h))
+        if not xs:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, empty, empty
+        return np.concatenate(xs), np.concatenate(ys), np.concatenate(ws), np.concatenate(hs)
+
+
+ORIENTED_WORK_SIZE = 1024
+ORIENTED_WINDOW = 15
+ORIENTED_CLOSE_SIZE = 15
+MIN_ORIENTATION_COHERENCE = 0.5
+
+
+def structure_tensor(gray, window=ORIENTED_WINDOW):
+    """Windowed structure tensor components (Jxx, Jyy, Jxy) as float32 maps"""
+    gx = cv2.Scharr(gray, cv2.CV_32F, 1, 0)
+    gy = cv2.Scharr(gray, cv2.CV_32F, 0, 1)
+    size = (window, window)
+    return (cv2.blur(gx * gx, size), cv2.blur(gy * gy, size), cv2.blur(gx * gy, size))
+
+
+def localize_oriented_barcodes(gray, max_candidates=MAX_CANDIDATES):
+    """Rotation-invariant localizer: boxes of strong, coherently oriented gradients
+
+    Unlike localize_barcodes it does not assume vertical bars. It runs on a
+    copy shrunk to ORIENTED_WORK_SIZE and returns boxes in full-size
+    coordinates; rotated barcodes get their axis-aligned bounding box.
+    """
+    if gray is None or gray.size == 0:
+        return []
+    if len(gray.shape) == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    scale = min(1.0, ORIENTED_WORK_SIZE / max(height, width))
+    small = cv2.resize(gray, (max(1, int(width * scale)), max(1, int(height * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+    jxx, jyy, jxy = structure_tensor(small)
+    energy = jxx + jyy
+    anisotropy = cv2.sqrt((jxx - jyy) ** 2 + 4 * jxy * jxy)
+    # coherence * sqrt(energy) == anisotropy / sqrt(energy)
+    response = anisotropy / cv2.sqrt(energy + 1e-6)
+    response = cv2.normalize(response, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+    _, mask = cv2.threshold(response, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (ORIENTED_CLOSE_SIZE, ORIENTED_CLOSE_SIZE))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if count <= 1:
+        return []
+    stats = stats[1:]
+    x, y, w, h, area = (stats[:, i] for i in range(5))
+    keep = (np.maximum(w, h) >= MIN_CANDIDATE_WIDTH * scale) & (np.minimum(w, h) >= MIN_CANDIDATE_HEIGHT * scale)
+    if not np.any(keep):
+        return []
+    x, y, w, h, area = x[keep], y[keep], w[keep], h[keep], area[keep]
+
+    integral = cv2.integral(response, sdepth=cv2.CV_64F)
+    box_area = (w * h).astype(np.float64)
+    mean_response = (integral[y + h, x + w] - integral[y, x + w]
+                     - integral[y + h, x] + integral[y, x]) / box_area
+    score = mean_response * (area / box_area) * np.log1p(area)
+
+    order = np.argsort(-score)[:max_candidates]
+    return [
+        BarcodeCandidate(int(x[i] / scale), int(y[i] / scale), int(np.ceil(w[i] / scale)),
+                         int(np.ceil(h[i] / scale)), float(score[i]))
+        for i in order
+    ]
+
+
+def estimate_orientation(gray):
+    """Dominant gradient angle of a crop in degrees (-90..90] and its coherence (0..1)
+
+    For a 1D barcode the gradient runs across the bars, so 0 means upright
+    (vertical bars). Coherence near 1 means one clear direction.
+    """
+    if len(gray.shape) == 3:
+        gray = cv2.cvtColor(gray, cv2.COLOR_BGR2GRAY)
+    gx = cv2.Scharr(gray, cv2.CV_32F, 1, 0)
+    gy = cv2.Scharr(gray, cv2.CV_32F, 0, 1)
+    jxx = float(np.dot(gx.ravel(), gx.ravel()))
+    jyy = float(np.dot(gy.ravel(), gy.ravel()))
+    jxy = float(np.dot(gx.ravel(), gy.ravel()))
+    if jxx + jyy <= 0:
+        return 0.0, 0.0
+    angle = 0.5 * np.degrees(np.arctan2(2 * jxy, jxx - jyy))
+    coherence = np.sqrt((jxx - jyy) ** 2 + 4 * jxy * jxy) / (jxx + jyy)
+    return float(angle), float(coherence)
+
+
+def deskew_crop(image, angle):
+    """Rotate a crop so a gradient at angle degrees becomes horizontal (bars vertical)
+
+    The canvas grows to keep the corners, and the border replicates edge
+    pixels so the padding does not look like extra bars.
+    """
+    height, width = image.shape[:2]
+    center = (width / 2, height / 2)
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width = int(height * sin + width * cos)
+    new_height = int(height * cos + width * sin)
+    matrix[0, 2] += new_width / 2 - center[0]
+    matrix[1, 2] += new_height / 2 - center[1]
+    return cv2.warpAffine(image, matrix, (new_width, new_height),
+                          flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless batch mode
+ประมวลผลไฟล์ภาพแบบไม่มีหน้าจอ (สำหรับ cron หรือเซิร์ฟเวอร์)
+
+Usage:
+  python main.py --batch FOLDER_OR_FILE [...] [--list FILE] [--workers N]
+                 [--policy suffix|skip|overwrite] [--no-rename] [--no-cache]
+                 [--quality-gate off|lenient|normal|strict] [--output results.jsonl]
+                 [--profile]
+
+Every file produces one JSON Lines record; a final record with
+"event": "summary" reports counts and throughput. Decoding uses the same
+barcode_engine as the desktop GUI.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from barcode_engine import (
+    read_barcode_from_image, clean_barcode_text, init_strategy_stats, flush_strategy_stats,
+    is_cacheable, cache_engine_key
+)
+from region_prior import RegionPrior
+from threshold_tuner import ThresholdTuner
+from quality_gate import STRICTNESS_SCALE
+from rename_plan import COLLISION_POLICIES, COLLISION_SUFFIX, build_rename_plan, apply_rename_plan
+from log_config import configure_logging
+
+IMAGE_PATTERNS = ['*.jpg', '*.jpeg', '*.JPG', '*.JPEG']
+
+logger = logging.getLogger(__name__)
+
+# Barcode regions and threshold ladder learned by this process (each pool
+# worker learns its own)
+_region_prior = None
+_threshold_tuner = None
+
+# Decode cache of this process; pool workers open their own connection
+_decode_cache = None
+
+# Strategy statistics are written to SQLite every this many decoded files
+# (and when the process or pool worker finishes)
+STRATEGY_STATS_FLUSH_EVERY = 50
+_decoded_since_flush = 0
+
+
+def collect_image_files(paths, list_file=None):
+    """Expand folders and file lists into image file paths (same patterns as the GUI)"""
+    candidates = list(paths)
+    if list_file:
+        handle = sys.stdin if list_file == '-' else open(list_file, 'r', encoding='utf-8')
+        try:
+            candidates.extend(line.strip() for line in handle if line.strip())
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+    file_paths = []
+    seen = set()
+    for candidate in candidates:
+        if os.path.isdir(candidate):
+            found = []
+            for ext in IMAGE_PATTERNS:
+                found.extend(str(f) for f in Path(candidate).glob(ext))
+            found.sort()
+        else:
+            found = [candidate]
+        for path in found:
+            key = os.path.normcase(os.path.abspath(path))
+            if key not in seen:
+                seen.add(key)
+                file_paths.append(path)
+    return file_paths
+
+
+def _reset_batch_state():
+    global _region_prior, _threshold_tuner
+    _region_prior = RegionPrior()
+    _threshold_tuner = ThresholdTuner()
+
+
+def _init_worker(cache_config=None):
+    global _decode_cache
+    # Spawned workers (Windows) start without the parent's logging setup
+    configure_logging()
+    _reset_batch_state()
+    if cache_config is not None:
+        from decode_cache import DecodeCache
+        _decode_cache = DecodeCache(*cache_config)
+    # Pool workers leave through os._exit, skipping atexit; multiprocessing
+    # finalizers still run (before the log listener stops at priority 0)
+    import multiprocessing.util
+    multiprocessing.util.Finalize(None, flush_strategy_stats, exitpriority=10)
+
+
+def _decode_one(file_path):
+    """Worker entry point: answer from the decode cache, or decode one file and time it
+
+    Returns (path, barcode_text, error, seconds, cached, prior_hit);
+    prior_hit is True/False when learned regions were tried, else None.
+    """
+    global _decoded_since_flush
+    if _decode_cache is not None:
+        cached = _decode_cache.lookup(file_path)
+        if cached is not None:
+            return file_path, cached[0], cached[1], 0.0, True, None
+    if _region_prior is None:
+        _reset_batch_state()
+    attempts, hits = _region_prior.attempts, _region_prior.hits
+    started = time.perf_counter()
+    barcode_text, error = read_barcode_from_image(file_path, _region_prior, _threshold_tuner)
+    seconds = time.perf_counter() - started
+    _decoded_since_flush += 1
+    if _decoded_since_flush >= STRATEGY_STATS_FLUSH_EVERY:
+        _decoded_since_flush = 0
+        flush_strategy_stats()
+    if _decode_cache is not None and is_cacheable(barcode_text, error):
+        _decode_cache.store(file_path, barcode_text, error)
+    prior_hit = _region_prior.hits > hits if _region_prior.attempts > attempts else None
+    return file_path, barcode_text, error, seconds, False, prior_hit
+
+
+def decode_files(file_paths, workers=1, cache=None):
+    """Decode files in parallel, yielding (path, barcode_text, error, seconds, cached, prior_hit)
+
+    Cache lookups and stores run in the workers, next to the decode.
+    """
+    global _decode_cache
+    if workers <= 1 or len(file_paths) <= 1:
+        _reset_batch_state()
+        _decode_cache = cache
+        try:
+            for file_path in file_paths:
+                yield _decode_one(file_path)
+        finally:
+            _decode_cache = None
+            flush_strategy_stats()
+        return
+
+    cache_config = (cache.db_path, cache.engine) if cache else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache_config,)) as executor:
+        futures = [executor.submit(_decode_one, file_path) for file_path in file_paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def strategy_summary():
+    """Persisted per-strategy statistics, including what the workers just saved"""
+    stats = init_strategy_stats()
+    if stats is None:
+        return None
+    stats.load()
+    return stats.summary()
+
+
+def run_batch(file_paths, workers=1, policy=COLLISION_SUFFIX, rename=True, cache=None, out=None):
+    """Decode, rename and write JSON Lines records; returns the summary dict"""
+    out = out or sys.stdout
+    started = time.perf_counter()
+    decode_seconds = 0.0
+    counts = {'decoded': 0, 'failed': 0, 'cached': 0, 'renamed': 0, 'rename_failed': 0,
+              'prior_attempts': 0, 'prior_hits': 0}
+    rename_items = []
+
+    def emit(record):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    for file_path, barcode_text, error, seconds, cached, prior_hit in decode_files(file_paths, workers, cache):
+        decode_seconds += seconds
+        counts['cached'] += int(cached)
+        if prior_hit is not None:
+            counts['prior_attempts'] += 1
+            counts['prior_hits'] += int(prior_hit)
+        if barcode_text:
+            counts['decoded'] += 1
+            rename_items.append((file_path, clean_barcode_text(barcode_text)))
+        else:
+            counts['failed'] += 1
+        emit({
+            'event': 'result',
+            'path': file_path,
+            'barcode_text': barcode_text,
+            'status': 'success' if barcode_text else 'error',
+            'error': error,
+            'cached': cached,
+            'prior_hit': prior_hit,
+            'decode_ms': round(seconds * 1000, 2),
+        })
+
+    journal_path = None
+    if rename and rename_items:
+        plan, journal_path = apply_rename_plan(build_rename_plan(rename_items, policy))
+        for op in plan:
+            if op.status == 'done':
+                counts['renamed'] += 1
+                if cache:
+                    cache.move(op.src, op.dst)
+            elif op.status in ('skipped', 'failed'):
+                counts['rename_failed'] += 1
+            emit({'event': 'rename', **op.to_dict()})
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        'event': 'summary',
+        'files': len(file_paths),
+        **counts,
+        'prior_hit_rate': round(counts['prior_hits'] / counts['prior_attempts'], 3) if counts['prior_attempts'] else None,
+        'workers': workers,
+        'elapsed_s': round(elapsed, 3),
+        'decode_cpu_s': round(decode_seconds, 3),
+        'files_per_s': round(len(file_paths) / elapsed, 2) if elapsed > 0 else None,
+        'journal': journal_path,
+        # Only known when decoding ran in this process (one worker)
+        'threshold_ladder': _threshold_tuner.stats() if _threshold_tuner is not None else None,
+        'strategy_stats': strategy_summary(),
+    }
+    emit(summary)
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='main.py --batch',
+        description='อ่าน barcode และเปลี่ยนชื่อไฟล์แบบไม่มีหน้าจอ (JSON Lines output)'
+    )
+    parser.add_argument('paths', nargs='*', help='ไฟล์ภาพหรือโฟลเดอร์')
+    parser.add_argument('--list', dest='list_file', help="ไฟล์รายชื่อภาพ บรรทัดละหนึ่งไฟล์ ('-' = stdin)")
+    parser.add_argument('--workers', type=int, help='จำนวน process สำหรับอ่าน barcode (ค่าเริ่มต้น: จำนวน CPU)')
+    parser.add_argument('--policy', choices=COLLISION_POLICIES, default=COLLISION_SUFFIX,
+                        help='วิธีจัดการเมื่อชื่อไฟล์ซ้ำ')
+    parser.add_argument('--no-rename', action='store_true', help='อ่าน barcode อย่างเดียว ไม่เปลี่ยนชื่อไฟล์')
+    parser.add_argument('--no-cache', action='store_true', help='ไม่ใช้แคชผลการอ่าน')
+    parser.add_argument('--quality-gate', choices=list(STRICTNESS_SCALE),
+                        help='ความเข้มงวดของการตรวจคุณภาพภาพก่อนอ่าน (ค่าเริ่มต้นจาก BARCODE_QUALITY_GATE หรือ normal)')
+    parser.add_argument('--output', help='เขียนผลลัพธ์ลงไฟล์แทน stdout')
+    parser.add_argument('--profile', action='store_true',
+                        help='บันทึกโปรไฟล์ (flamegraph .folded, cProfile, tracemalloc) ไว้ข้างไฟล์ผลลัพธ์')
+    return parser
+
+
+def main(argv=None):
+    """Entry point for `python main.py --batch ...`; returns the process exit code"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.profile and args.workers is not None and args.workers > 1:
+        # The profilers only see this process, so decoding has to run here
+        parser.error("--profile ใช้ได้กับ --workers 1 เท่านั้น")
+    configure_logging()
+    file_paths = collect_image_files(args.paths, args.list_file)
+    if not file_paths:
+        print("ไม่พบไฟล์ภาพ JPG ที่ระบุ", file=sys.stderr)
+        return 2
+
+    if args.quality_gate:
+        # Read per call by quality_gate, and inherited by the worker processes
+        os.environ['BARCODE_QUALITY_GATE'] = args.quality_gate
+
+    cache = None
+    if not args.no_cache:
+        try:
+            from decode_cache import DecodeCache
+            cache = DecodeCache(engine=cache_engine_key('desktop'))
+        except Exception as e:
+            logger.warning(f"Decode cache disabled: {str(e)}")
+
+    workers = max(1, args.workers or os.cpu_count() or 1)
+    profiler = None
+    if args.profile:
+        from profiling import BatchProfiler
+        if workers > 1:
+            print(f"--profile: อ่าน barcode ใน process เดียว (ไม่ใช้ {workers} process ตามจำนวน CPU)", file=sys.stderr)
+        workers = 1
+        profiler = BatchProfiler(os.path.dirname(os.path.abspath(args.output)) if args.output else os.getcwd())
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        with profiler or nullcontext():
+            summary = run_batch(
+                file_paths,
+                workers=workers,
+                policy=args.policy,
+                rename=not args.no_rename,
+                cache=cache,
+                out=out,
+            )
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if profiler is not None and profiler.paths:
+        print(f"บันทึกโปรไฟล์: {', '.join(profiler.paths)}", file=sys.stderr)
+
+    print(
+        f"เสร็จสิ้น: {summary['files']} ไฟล์, สำเร็จ {summary['decoded']}, ล้มเหลว {summary['failed']}, "
+        f"{summary['files_per_s']} ไฟล์/วินาที",
+        file=sys.stderr
+    )
+    return 0 if summary['failed'] == 0 and summary['rename_failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
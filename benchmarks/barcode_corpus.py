@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic Code 128 corpus
+สร้างชุดภาพทดสอบ barcode Code 128 ที่รู้ค่าจริง (ทำซ้ำได้ด้วย seed เดิม)
+
+Each image is a document-like page (text lines, a header box) with one Code
+128-B barcode carrying a known payload near the top. Noise, blur, rotation,
+JPEG quality and resolution are controllable, and every image is listed with
+its payload and parameters in manifest.json.
+
+Usage:
+  python benchmarks/barcode_corpus.py OUT_DIR [--count 50] [--seed 1234]
+         [--noise 0.0,0.02] [--blur 0,1.5] [--rotation 0,3] [--quality 60,95]
+         [--dpi 150,300]
+"""
+
+import os
+import sys
+import json
+import string
+import argparse
+
+import cv2
+import numpy as np
+
+# Code 128 symbol widths (bar, space, bar, space, bar, space), values 0-106
+CODE128_PATTERNS = [
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+]
+START_B = 104
+STOP = 106
+
+DEFAULT_PAYLOAD = "ARHZ43I03901"
+A4_INCHES = (8.27, 11.69)
+
+
+def code128_modules(payload):
+    """Module widths (alternating bar/space, starting with a bar) for Code 128-B"""
+    values = [START_B] + [ord(c) - 32 for c in payload]
+    if any(v < 0 or v > 95 for v in values[1:]):
+        raise ValueError(f"Code 128-B cannot encode {payload!r}")
+    checksum = (values[0] + sum(i * v for i, v in enumerate(values[1:], 1))) % 103
+    return [int(w) for v in values + [checksum, STOP] for w in CODE128_PATTERNS[v]]
+
+
+def render_barcode(payload, module_px, height_px):
+    """Black-on-white barcode image with a 10-module quiet zone"""
+    modules = code128_modules(payload)
+    quiet = 10 * module_px
+    width = sum(modules) * module_px + 2 * quiet
+    image = np.full((height_px, width), 255, dtype=np.uint8)
+    x = quiet
+    for i, w in enumerate(modules):
+        if i % 2 == 0:
+            image[:, x:x + w * module_px] = 0
+        x += w * module_px
+    return image
+
+
+def random_payload(rng):
+    """Payload shaped like the document codes (4 letters, 2 digits, letter, 5 digits)"""
+    letters, digits = string.ascii_uppercase, string.digits
+    pick = lambda alphabet, n: ''.join(alphabet[i] for i in rng.integers(0, len(alphabet), n))
+    return pick(letters, 4) + pick(digits, 2) + pick(letters, 1) + pick(digits, 5)
+
+
+def make_page(payload, rng, dpi=200, noise=0.0, blur=0.0, rotation=0.0):
+    """Grayscale A4 page at dpi with the barcode in the top third"""
+    width, height = int(A4_INCHES[0] * dpi), int(A4_INCHES[1] * dpi)
+    page = np.full((height, width), 245, dtype=np.uint8)
+
+    # Header box and body text lines
+    cv2.rectangle(page, (width // 12, height // 40), (width // 2, height // 12), 60, max(1, dpi // 100))
+    scale = dpi / 200
+    for row in range(height // 4, height - height // 12, max(12, int(40 * scale))):
+        cv2.putText(page, "Lorem ipsum dolor sit amet 0123456789 / 2568", (width // 12, row),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8 * scale, 40, max(1, int(2 * scale)))
+
+    # Barcode: 0.25 mm modules (about 0.01 in) and 12 mm tall
+    module_px = max(1, int(round(dpi / 100)))
+    barcode = render_barcode(payload, module_px, int(dpi * 0.5))
+    bx = width // 2 - barcode.shape[1] // 2 + int(rng.integers(-width // 10, width // 10))
+    by = height // 10 + int(rng.integers(0, height // 20))
+    bx = min(max(0, bx), width - barcode.shape[1])
+    page[by:by + barcode.shape[0], bx:bx + barcode.shape[1]] = barcode
+    cv2.putText(page, payload, (bx + 10 * module_px, by + barcode.shape[0] + int(30 * scale)),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.9 * scale, 0, max(1, int(2 * scale)))
+
+    if rotation:
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), rotation, 1.0)
+        page = cv2.warpAffine(page, matrix, (width, height), borderValue=245)
+    if blur:
+        page = cv2.GaussianBlur(page, (0, 0), blur)
+    if noise:
+        speckle = rng.random(page.shape) < noise
+        page[speckle] = rng.integers(0, 256, int(speckle.sum()), dtype=np.uint8)
+    return cv2.cvtColor(page, cv2.COLOR_GRAY2BGR)
+
+
+def parse_range(text, cast=float):
+    low, _, high = text.partition(',')
+    return cast(low), cast(high or low)
+
+
+def generate_corpus(out_dir, count=50, seed=1234, noise=(0.0, 0.02), blur=(0.0, 1.5),
+                    rotation=(0.0, 3.0), quality=(60, 95), dpi=(150, 300), default_share=0.25):
+    """Write count JPEGs and manifest.json into out_dir; returns the manifest entries
+
+    A default_share of the pages carry DEFAULT_PAYLOAD; the rest get random
+    payloads so a decoder that always returns the same text is not rewarded.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    entries = []
+    for i in range(count):
+        payload = DEFAULT_PAYLOAD if rng.random() < default_share else random_payload(rng)
+        params = {
+            'dpi': int(rng.integers(dpi[0], dpi[1] + 1)),
+            'noise': round(float(rng.uniform(*noise)), 4),
+            'blur': round(float(rng.uniform(*blur)), 2),
+            'rotation': round(float(rng.uniform(-rotation[1], rotation[1])) if rotation[1] else 0.0, 2),
+            'quality': int(rng.integers(quality[0], quality[1] + 1)),
+        }
+        page = make_page(payload, rng, params['dpi'], params['noise'], params['blur'], params['rotation'])
+        name = f"page_{i:04d}.jpg"
+        cv2.imwrite(os.path.join(out_dir, name), page, [cv2.IMWRITE_JPEG_QUALITY, params['quality']])
+        entries.append({'file': name, 'payload': payload, **params})
+
+    manifest = {'seed': seed, 'count': count, 'images': entries}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir')
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--noise', default='0.0,0.02', help='สัดส่วนจุด noise (min,max)')
+    parser.add_argument('--blur', default='0,1.5', help='Gaussian sigma (min,max)')
+    parser.add_argument('--rotation', default='0,3', help='องศาการหมุนสูงสุด (ใช้ค่า max)')
+    parser.add_argument('--quality', default='60,95', help='JPEG quality (min,max)')
+    parser.add_argument('--dpi', default='150,300', help='ความละเอียด (min,max)')
+    args = parser.parse_args()
+
+    entries = generate_corpus(
+        args.out_dir, args.count, args.seed,
+        noise=parse_range(args.noise), blur=parse_range(args.blur),
+        rotation=parse_range(args.rotation), quality=parse_range(args.quality, int),
+        dpi=parse_range(args.dpi, int),
+    )
+    print(f"เขียนภาพ {len(entries)} ไฟล์ไปที่ {args.out_dir}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
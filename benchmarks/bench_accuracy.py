@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: decode accuracy and latency per backend on a synthetic corpus
+วัดความแม่นยำและเวลาอ่าน barcode ของแต่ละ backend ด้วยชุดภาพที่รู้ค่าจริง
+
+Backends:
+  web     app.read_barcode_from_image (Flask app cascade)
+  engine  barcode_engine.read_barcode_from_image (desktop GUI and batch CLI)
+  zxing   ZXingWorker (needs Java and pyzxing's jar)
+
+Reports p50/p95/p99 latency, throughput and accuracy per backend as JSON.
+With --compare, deltas against an earlier report are added.
+
+Usage:
+  python benchmarks/bench_accuracy.py [--corpus DIR | --count 50 --seed 1234]
+         [--backends web,engine,zxing] [--repeat 1] [--output report.json]
+         [--compare previous.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from barcode_corpus import generate_corpus
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def load_backend(name):
+    """Return decode(path) -> barcode_text or None, or raise if unavailable"""
+    if name == 'web':
+        import app
+        return lambda path: app.read_barcode_from_image(path)[0]
+    if name == 'engine':
+        import barcode_engine
+        return lambda path: barcode_engine.read_barcode_from_image(path)[0]
+    if name == 'zxing':
+        from zxing_worker import ZXingWorker
+        worker = ZXingWorker()
+        return worker.decode
+    raise ValueError(f"unknown backend {name}")
+
+
+def run_backend(decode, corpus_dir, entries, repeat):
+    latencies = []
+    correct = wrong = missed = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for entry in entries:
+            path = os.path.join(corpus_dir, entry['file'])
+            t0 = time.perf_counter()
+            barcode_text = decode(path)
+            latencies.append(time.perf_counter() - t0)
+            if not barcode_text:
+                missed += 1
+            elif barcode_text == entry['payload']:
+                correct += 1
+            else:
+                wrong += 1
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    total = len(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None
+    return {
+        'images': total,
+        'accuracy': round(correct / total, 4) if total else None,
+        'correct': correct,
+        'wrong': wrong,
+        'missed': missed,
+        'p50_ms': ms(percentile(latencies, 0.50)),
+        'p95_ms': ms(percentile(latencies, 0.95)),
+        'p99_ms': ms(percentile(latencies, 0.99)),
+        'mean_ms': ms(sum(latencies) / total) if total else None,
+        'images_per_s': round(total / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
+def compare(report, previous):
+    """Deltas of the headline numbers against a previous report"""
+    deltas = {}
+    for name, result in report['backends'].items():
+        before = previous.get('backends', {}).get(name)
+        if not before or 'error' in result or 'error' in before:
+            continue
+        deltas[name] = {
+            key: round(result[key] - before[key], 4)
+            for key in ('accuracy', 'p50_ms', 'p95_ms', 'p99_ms', 'images_per_s')
+            if result.get(key) is not None and before.get(key) is not None
+        }
+    return deltas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='โฟลเดอร์ที่มี manifest.json (จาก barcode_corpus.py)')
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--backends', default='web,engine,zxing')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', help='เขียนรายงาน JSON ลงไฟล์')
+    parser.add_argument('--compare', help='รายงาน JSON ก่อนหน้าสำหรับเปรียบเทียบ')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus_dir = args.corpus
+        if not corpus_dir:
+            corpus_dir = os.path.join(workdir, 'corpus')
+            generate_corpus(corpus_dir, args.count, args.seed)
+        with open(os.path.join(corpus_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        # app.py creates uploads/ and downloads/ in the working directory
+        previous_cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            report = {
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'corpus': {'dir': args.corpus, 'seed': manifest['seed'], 'images': len(manifest['images'])},
+                'backends': {},
+            }
+            for name in [b.strip() for b in args.backends.split(',') if b.strip()]:
+                try:
+                    decode = load_backend(name)
+                except Exception as e:
+                    report['backends'][name] = {'error': f"{type(e).__name__}: {str(e)[:200]}"}
+                    continue
+                report['backends'][name] = run_backend(decode, corpus_dir, manifest['images'], args.repeat)
+        finally:
+            os.chdir(previous_cwd)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            report['delta'] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
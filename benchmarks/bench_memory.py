@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: peak memory per image, default vs low-memory mode
+วัดหน่วยความจำสูงสุดต่อภาพ ระหว่างโหมดปกติกับโหมดประหยัดหน่วยความจำ
+
+Each run decodes one large synthetic scan in a fresh child process (so peaks
+do not carry over) with app.read_barcode_from_image, once with
+BARCODE_LOW_MEMORY=0 and once with BARCODE_LOW_MEMORY=1, and reports the
+child's peak RSS.
+
+Usage:
+  python benchmarks/bench_memory.py [--megapixels 50] [--image scan.jpg]
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = r"""
+import os, sys, json, time
+sys.path.insert(0, sys.argv[1])
+import app
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / 1024 if sys.platform != 'darwin' else peak / (1024 * 1024)
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except Exception:
+            return None
+
+baseline = peak_rss_mb()
+started = time.perf_counter()
+barcode_text, error = app.read_barcode_from_image(sys.argv[2])
+print(json.dumps({
+    'low_memory': app.LOW_MEMORY_MODE,
+    'peak_rss_mb': round(peak_rss_mb(), 1) if baseline is not None else None,
+    'import_rss_mb': round(baseline, 1) if baseline is not None else None,
+    'seconds': round(time.perf_counter() - started, 2),
+    'barcode_text': barcode_text,
+}))
+"""
+
+
+def make_large_scan(path, megapixels):
+    """Write a large A3-like synthetic scan with a barcode near the top"""
+    import cv2
+    import numpy as np
+
+    width = int((megapixels * 1e6 / 1.414) ** 0.5)
+    height = int(width * 1.414)
+    rng = np.random.default_rng(42)
+    page = np.full((height, width), 235, dtype=np.uint8)
+    x = width // 5
+    while x < width // 2:
+        bar = int(rng.integers(4, 20))
+        page[height // 20:height // 20 + height // 40, x:x + bar] = 20
+        x += bar + int(rng.integers(4, 20))
+    for row in range(height // 6, height - 200, 120):
+        cv2.putText(page, "Document text line 0123456789", (200, row),
+                    cv2.FONT_HERSHEY_SIMPLEX, 3, 40, 6)
+    cv2.imwrite(path, cv2.cvtColor(page, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return height, width
+
+
+def run_child(image_path, low_memory, workdir):
+    env = dict(os.environ, BARCODE_LOW_MEMORY='1' if low_memory else '0')
+    completed = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT, REPO_DIR, image_path],
+        env=env, cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    return json.loads(completed.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--megapixels', type=float, default=50)
+    parser.add_argument('--image', help='ใช้ภาพที่มีอยู่แทนภาพสังเคราะห์')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        image_path = args.image
+        shape = None
+        if not image_path:
+            image_path = os.path.join(workdir, 'large_scan.jpg')
+            shape = make_large_scan(image_path, args.megapixels)
+
+        report = {
+            'image': args.image or f"synthetic {shape[1]}x{shape[0]}",
+            'default': run_child(image_path, False, workdir),
+            'low_memory': run_child(image_path, True, workdir),
+        }
+    default_peak = report['default']['peak_rss_mb']
+    low_peak = report['low_memory']['peak_rss_mb']
+    if default_peak and low_peak:
+        report['saved_mb'] = round(default_peak - low_peak, 1)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
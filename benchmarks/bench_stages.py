@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: individual detector stages in isolation
+วัดเวลาและหน่วยความจำของแต่ละขั้นตอนการหา barcode แยกกัน
+
+Every stage runs over the same fixed image set (the synthetic corpus with a
+fixed seed, or --images DIR): warm-up calls first, then --repeat timed
+passes. Allocation peaks are measured in a separate tracemalloc pass so
+tracing does not distort the timings.
+
+--save-baseline writes the results; --baseline compares against a stored
+file and flags stages whose median got slower than --tolerance (exit 1).
+
+Usage:
+  python benchmarks/bench_stages.py [--images DIR] [--count 8] [--repeat 5] [--warmup 1]
+         [--stages full_image,visible,...] [--save-baseline FILE | --baseline FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from pathlib import Path
+
+import cv2
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from barcode_corpus import generate_corpus
+
+# Differences below this many milliseconds are treated as noise
+NOISE_FLOOR_MS = 0.05
+
+
+def build_stages(app):
+    """name -> stage(image, gray, candidates)"""
+    from threshold_tuner import run_threshold_ladder
+
+    if app.PYZBAR_AVAILABLE and app.pyzbar is not None:
+        ladder_decode = app.pyzbar.decode
+    else:
+        # Without pyzbar only the thresholding itself is measured
+        ladder_decode = lambda binary: None
+
+    return {
+        'localize': lambda image, gray, candidates: app.localize_barcodes(gray),
+        'full_image': lambda image, gray, candidates: app.detect_barcode_from_full_image(image, candidates),
+        'visible': lambda image, gray, candidates: app.detect_visible_barcode(image, candidates),
+        'enhanced': lambda image, gray, candidates: app.enhanced_pattern_detection(gray, candidates),
+        'full_scan': lambda image, gray, candidates: app.find_barcode_patterns_full_scan(gray, candidates),
+        'opencv_fallback': lambda image, gray, candidates: app.read_barcode_opencv_fallback(image, candidates),
+        'threshold_ladder': lambda image, gray, candidates: run_threshold_ladder(gray, ladder_decode),
+    }
+
+
+def load_images(paths):
+    images = []
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def time_stage(stage, inputs, warmup, repeat):
+    for _ in range(warmup):
+        for args in inputs:
+            stage(*args)
+    samples = []
+    for _ in range(repeat):
+        for args in inputs:
+            started = time.perf_counter()
+            stage(*args)
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'calls': len(samples),
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'stdev_ms': round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        'p95_ms': round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3),
+    }
+
+
+def allocation_stats(stage, inputs):
+    """Largest tracemalloc peak over one call per input, and the blocks left behind"""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for args in inputs:
+            tracemalloc.reset_peak()
+            before_blocks = sys.getallocatedblocks()
+            start_bytes, _ = tracemalloc.get_traced_memory()
+            stage(*args)
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            peaks.append((peak_bytes - start_bytes, sys.getallocatedblocks() - before_blocks))
+    finally:
+        tracemalloc.stop()
+    return {
+        'peak_alloc_kb': round(max(p for p, _ in peaks) / 1024, 1),
+        'net_blocks': max(b for _, b in peaks),
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('stages', {}).get(name)
+        if not before:
+            continue
+        slower = result['median_ms'] - before['median_ms']
+        if slower > NOISE_FLOOR_MS and result['median_ms'] > before['median_ms'] * (1 + tolerance):
+            regressions.append({
+                'stage': name,
+                'baseline_ms': before['median_ms'],
+                'median_ms': result['median_ms'],
+                'change': f"+{slower / before['median_ms'] * 100:.1f}%" if before['median_ms'] else None,
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='โฟลเดอร์ภาพ JPG (ค่าเริ่มต้น: ชุดภาพสังเคราะห์)')
+    parser.add_argument('--count', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--stages', help='รายชื่อขั้นตอน คั่นด้วยจุลภาค')
+    parser.add_argument('--save-baseline', help='บันทึกผลเป็น baseline')
+    parser.add_argument('--baseline', help='เปรียบเทียบกับ baseline ที่บันทึกไว้')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='สัดส่วนที่ช้าลงได้ก่อนถือว่าถดถอย')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.images:
+            paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in ('.jpg', '.jpeg'))
+        else:
+            corpus_dir = os.path.join(workdir, 'corpus')
+            paths = [os.path.join(corpus_dir, e['file']) for e in generate_corpus(corpus_dir, args.count, args.seed)]
+        images = load_images(paths)
+
+        # app.py creates uploads/ and downloads/ in the working directory
+        previous_cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            import app
+        finally:
+            os.chdir(previous_cwd)
+
+    stages = build_stages(app)
+    if args.stages:
+        stages = {name: stages[name] for name in args.stages.split(',')}
+
+    inputs = []
+    for image in images:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        inputs.append((image, gray, app.localize_barcodes(gray)))
+
+    results = {}
+    for name, stage in stages.items():
+        results[name] = time_stage(stage, inputs, args.warmup, args.repeat)
+        results[name].update(allocation_stats(stage, inputs))
+
+    report = {
+        'images': len(images),
+        'source': args.images or f"synthetic seed={args.seed}",
+        'pyzbar': bool(app.PYZBAR_AVAILABLE),
+        'stages': results,
+    }
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            report['regressions'] = find_regressions(results, json.load(f), args.tolerance)
+        exit_code = 1 if report['regressions'] else 0
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    print(json.dumps(report, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
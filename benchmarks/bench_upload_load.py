@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test: concurrent operators uploading batches to /upload
+จำลองผู้ใช้หลายคนอัปโหลดไฟล์พร้อมกัน เพื่อหาขนาดเครื่อง/จำนวน worker ที่เหมาะสม
+
+Each client thread posts batches of synthetic corpus images to /upload
+(batch sizes drawn from --batch-sizes). Servers:
+  werkzeug    one threaded werkzeug server process per worker on its own
+              port; clients spread requests round-robin over the ports
+  gunicorn    gunicorn -w WORKERS (if installed)
+  testclient  Flask test client in this process (no network; workers = 1)
+
+For every (workers, concurrency) pair the report gives request latency
+p50/p95/p99, images/s and error rate, plus the concurrency at which
+images/s stops improving by more than --scaling-threshold for each worker
+count.
+
+Usage:
+  python benchmarks/bench_upload_load.py [--server werkzeug] [--workers 1,2,4]
+         [--concurrency 1,2,4,8] [--requests 10] [--batch-sizes 1,5,10]
+         [--count 20] [--output report.json]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from barcode_corpus import generate_corpus
+
+SERVER_SCRIPT = r"""
+import sys
+sys.path.insert(0, sys.argv[1])
+from werkzeug.serving import make_server
+from app import app
+make_server('127.0.0.1', int(sys.argv[2]), app, threaded=True).serve_forever()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(port, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise TimeoutError(f"server on port {port} did not start")
+
+
+class ServerPool:
+    """Starts the web app in subprocesses and stops them on exit"""
+
+    def __init__(self, kind, workers, workdir):
+        self.kind = kind
+        self.workers = workers
+        self.workdir = workdir
+        self.processes = []
+        self.ports = []
+
+    def __enter__(self):
+        env = dict(os.environ, PYTHONPATH=REPO_DIR)
+        if self.kind == 'gunicorn':
+            port = free_port()
+            command = [sys.executable, '-m', 'gunicorn', '-w', str(self.workers), '--threads', '4',
+                       '-b', f'127.0.0.1:{port}', '--timeout', '300', 'app:app']
+            self.processes.append(subprocess.Popen(command, cwd=self.workdir, env=env,
+                                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+            self.ports.append(port)
+        else:
+            for _ in range(self.workers):
+                port = free_port()
+                command = [sys.executable, '-c', SERVER_SCRIPT, REPO_DIR, str(port)]
+                self.processes.append(subprocess.Popen(command, cwd=self.workdir, env=env,
+                                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+                self.ports.append(port)
+        for port in self.ports:
+            wait_for_server(port)
+        return self
+
+    def __exit__(self, *exc):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def multipart_body(files):
+    """(content_type, body) for a list of (filename, bytes) under the 'files' field"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'.encode('utf-8') + data + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+def http_sender(port):
+    def send(files):
+        content_type, body = multipart_body(files)
+        request = urllib.request.Request(f"http://127.0.0.1:{port}/upload", data=body,
+                                         headers={'Content-Type': content_type}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+    return send
+
+
+def test_client_sender(app):
+    local = threading.local()
+
+    def send(files):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        data = {'files': [(io.BytesIO(blob), name) for name, blob in files]}
+        return local.client.post('/upload', data=data, content_type='multipart/form-data').status_code
+    return send
+
+
+def run_load(senders, corpus, concurrency, requests_per_client, batch_sizes, seed):
+    """Drive the senders from concurrency threads; returns latency/throughput stats"""
+    latencies = []
+    errors = 0
+    images = 0
+    lock = threading.Lock()
+
+    def client(index):
+        nonlocal errors, images
+        rng = np.random.default_rng(seed + index)
+        for n in range(requests_per_client):
+            size = int(rng.choice(batch_sizes))
+            picks = rng.integers(0, len(corpus), size)
+            # Unique names so concurrent batches do not overwrite each other's uploads
+            files = [(f"c{index}_{n}_{i}_{corpus[p][0]}", corpus[p][1]) for i, p in enumerate(picks)]
+            send = senders[(index + n) % len(senders)]
+            started = time.perf_counter()
+            try:
+                status = send(files)
+            except Exception:
+                status = None
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status != 200:
+                    errors += 1
+                else:
+                    images += size
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 1)
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': errors,
+        'error_rate': round(errors / len(latencies), 4) if latencies else None,
+        'p50_ms': pick(0.50),
+        'p95_ms': pick(0.95),
+        'p99_ms': pick(0.99),
+        'images_per_s': round(images / wall, 2) if wall > 0 else None,
+        'wall_s': round(wall, 2),
+    }
+
+
+def saturation_point(rows, threshold):
+    """Lowest concurrency after which images/s grows by less than threshold"""
+    rows = sorted(rows, key=lambda row: row['concurrency'])
+    for previous, current in zip(rows, rows[1:]):
+        if previous['images_per_s'] and current['images_per_s'] < previous['images_per_s'] * (1 + threshold):
+            return previous['concurrency']
+    return None
+
+
+def parse_list(text):
+    return [int(v) for v in text.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['werkzeug', 'gunicorn', 'testclient'], default='werkzeug')
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--concurrency', default='1,2,4,8')
+    parser.add_argument('--requests', type=int, default=10, help='จำนวน request ต่อ client')
+    parser.add_argument('--batch-sizes', default='1,5,10')
+    parser.add_argument('--count', type=int, default=20, help='จำนวนภาพในชุดภาพสังเคราะห์')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--scaling-threshold', type=float, default=0.10)
+    parser.add_argument('--output', help='เขียนรายงาน JSON ลงไฟล์')
+    args = parser.parse_args()
+
+    worker_counts = [1] if args.server == 'testclient' else parse_list(args.workers)
+    report = {'server': args.server, 'batch_sizes': parse_list(args.batch_sizes), 'runs': [], 'saturation': {}}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus_dir = os.path.join(workdir, 'corpus')
+        # Office-scanner resolution keeps a 10-file batch under the 16 MB upload limit
+        entries = generate_corpus(corpus_dir, args.count, args.seed, dpi=(150, 200))
+        corpus = []
+        for entry in entries:
+            with open(os.path.join(corpus_dir, entry['file']), 'rb') as f:
+                corpus.append((entry['file'], f.read()))
+
+        for workers in worker_counts:
+            rows = []
+            if args.server == 'testclient':
+                previous_cwd = os.getcwd()
+                os.chdir(workdir)
+                try:
+                    from app import app
+                    senders = [test_client_sender(app)]
+                    for concurrency in parse_list(args.concurrency):
+                        rows.append(run_load(senders, corpus, concurrency, args.requests,
+                                             report['batch_sizes'], args.seed))
+                finally:
+                    os.chdir(previous_cwd)
+            else:
+                with ServerPool(args.server, workers, workdir) as pool:
+                    senders = [http_sender(port) for port in pool.ports]
+                    for concurrency in parse_list(args.concurrency):
+                        rows.append(run_load(senders, corpus, concurrency, args.requests,
+                                             report['batch_sizes'], args.seed))
+            for row in rows:
+                report['runs'].append({'workers': workers, **row})
+                print(f"workers={workers} concurrency={row['concurrency']}: "
+                      f"{row['images_per_s']} images/s, p95 {row['p95_ms']} ms, errors {row['errors']}",
+                      file=sys.stderr)
+            report['saturation'][str(workers)] = saturation_point(rows, args.scaling_threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: per-call pyzxing vs batched zxing (one JVM per batch)
+เปรียบเทียบเวลาอ่าน barcode ระหว่าง pyzxing แบบเรียกทีละไฟล์ กับ ZXingWorker
+
+Usage:
+  python benchmarks/bench_zxing_worker.py FOLDER [--limit N] [--batch-size N]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from zxing_worker import ZXingWorker, find_zxing_jar
+
+
+def bench_per_call(file_paths):
+    """One JVM per file (what pyzxing.BarCodeReader.decode does)"""
+    from pyzxing import BarCodeReader
+    reader = BarCodeReader()
+    started = time.perf_counter()
+    decoded = 0
+    for path in file_paths:
+        results = reader.decode(path)
+        if results and results[0].get('parsed'):
+            decoded += 1
+    return time.perf_counter() - started, decoded
+
+
+def bench_worker(file_paths, jar_path, batch_size):
+    """ZXingWorker: one JVM per batch"""
+    worker = ZXingWorker(jar_path=jar_path, batch_size=batch_size)
+    started = time.perf_counter()
+    results = worker.decode_batch(file_paths)
+    elapsed = time.perf_counter() - started
+    return elapsed, sum(1 for text in results.values() if text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('folder', help='โฟลเดอร์ภาพ JPG')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    file_paths = sorted(
+        str(p) for p in Path(args.folder).iterdir()
+        if p.suffix.lower() in ('.jpg', '.jpeg')
+    )[:args.limit]
+    if not file_paths:
+        print("ไม่พบไฟล์ภาพ JPG", file=sys.stderr)
+        return 2
+
+    jar_path = find_zxing_jar()
+    per_call_s, per_call_decoded = bench_per_call(file_paths)
+    worker_s, worker_decoded = bench_worker(file_paths, jar_path, args.batch_size)
+
+    report = {
+        'files': len(file_paths),
+        'per_call': {
+            'elapsed_s': round(per_call_s, 3),
+            'ms_per_image': round(per_call_s * 1000 / len(file_paths), 1),
+            'decoded': per_call_decoded,
+        },
+        'worker': {
+            'elapsed_s': round(worker_s, 3),
+            'ms_per_image': round(worker_s * 1000 / len(file_paths), 1),
+            'decoded': worker_decoded,
+            'batch_size': args.batch_size,
+        },
+        'speedup': round(per_call_s / worker_s, 2) if worker_s > 0 else None,
+    }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
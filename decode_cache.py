@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent decode cache for incremental re-runs
+แคชผลการอ่าน barcode เพื่อข้ามไฟล์ที่ไม่เปลี่ยนแปลงเมื่อประมวลผลซ้ำ
+
+Results are stored in a per-user SQLite database keyed by (path, size, mtime).
+When the stat key misses (file was renamed or copied), a SHA-1 of the content
+is used as a fallback key. The database runs in WAL mode with a busy timeout,
+so several processes (GUI, CLI batch, web workers) can share it.
+
+Results are only valid for the decoder that produced them: engine_key()
+names the program, the decoder backend, DECODER_VERSION and the quality-gate
+setting, so a run with pyzbar newly installed or the gate turned off does
+not get another configuration's "not found".
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.barcode_reader', 'decode_cache.sqlite3')
+HASH_CHUNK_SIZE = 1024 * 1024
+BUSY_TIMEOUT = 30.0
+WRITE_RETRIES = 5
+
+# Bump when a decoder change can make earlier results (including "not found") stale
+DECODER_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decode_results (
+    path TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT,
+    barcode TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (path, engine)
+);
+CREATE INDEX IF NOT EXISTS idx_decode_results_digest ON decode_results (digest, engine);
+"""
+
+
+def file_digest(path):
+    """SHA-1 of the file content"""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def engine_key(name, backend, quality_gate=None):
+    """Engine column for results of program name with decoder backend under a quality-gate setting"""
+    key = f"{name}/{backend}/v{DECODER_VERSION}"
+    return f"{key}/gate={quality_gate}" if quality_gate else key
+
+
+class DecodeCache:
+    """SQLite-backed cache of (barcode_text, error) per image file
+
+    engine identifies the decoder that produced the results, so switching
+    between desktop variants never returns another decoder's answers.
+    """
+
+    def __init__(self, db_path=None, engine='default'):
+        self.db_path = db_path or DEFAULT_CACHE_PATH
+        self.engine = engine
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._execute_write(lambda conn: conn.executescript(_SCHEMA))
+
+    def _connection(self):
+        """One connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _execute_write(self, operation):
+        """Run a write in its own transaction, retrying while another process holds the lock"""
+        for attempt in range(WRITE_RETRIES):
+            try:
+                conn = self._connection()
+                with conn:
+                    return operation(conn)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+
+    def lookup(self, path):
+        """Return (barcode_text, error) for an unchanged file, or None on a miss"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        key = os.path.abspath(path)
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT size, mtime_ns, barcode, error FROM decode_results WHERE path = ? AND engine = ?",
+            (key, self.engine)
+        ).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            self.hits += 1
+            return row[2], row[3]
+
+        # Content-hash fallback: file was renamed, copied or touched
+        try:
+            digest = file_digest(path)
+        except OSError:
+            self.misses += 1
+            return None
+        row = conn.execute(
+            "SELECT barcode, error FROM decode_results WHERE digest = ? AND engine = ? AND size = ? LIMIT 1",
+            (digest, self.engine, st.st_size)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            # The store() after decoding this file reuses the digest
+            self._local.last_digest = (key, st.st_size, st.st_mtime_ns, digest)
+            return None
+
+        self.hits += 1
+        self._upsert(key, st, digest, row[0], row[1])
+        return row[0], row[1]
+
+    def store(self, path, barcode_text, error=None):
+        """Record the decode result for a file"""
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(path)
+            last = getattr(self._local, 'last_digest', None)
+            if last is not None and last[:3] == (key, st.st_size, st.st_mtime_ns):
+                digest = last[3]
+            else:
+                digest = file_digest(path)
+        except OSError:
+            return
+        self._local.last_digest = None
+        self._upsert(key, st, digest, barcode_text, error)
+
+    def _upsert(self, key, st, digest, barcode_text, error):
+        self._execute_write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO decode_results "
+            "(path, engine, size, mtime_ns, digest, barcode, error, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, self.engine, st.st_size, st.st_mtime_ns, digest, barcode_text, error, time.time())
+        ))
+
+    def move(self, src, dst):
+        """Follow a rename so the next run hits on the stat key"""
+        self._execute_write(lambda conn: conn.execute(
+            "UPDATE OR REPLACE decode_results SET path = ? WHERE path = ? AND engine = ?",
+            (os.path.abspath(dst), os.path.abspath(src), self.engine)
+        ))
+
+    def close(self):
+        """Close the connection of the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
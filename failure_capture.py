@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sampled capture of failed decodes for offline analysis
+เก็บภาพที่อ่าน barcode ไม่สำเร็จพร้อมภาพขั้นกลาง เพื่อนำไปวิเคราะห์ภายหลัง
+
+A sampled fraction of failures is kept as one folder per file:
+
+    <capture dir>/20261019-142501-123456_scan_0042/
+        input.jpg                 the uploaded file as received
+        gray.png                  upright grayscale page
+        threshold_otsu.png, ...   the classic threshold ladder
+        crop_0.png, ...           localizer candidates (best first)
+        meta.json                 error, stage timings (ms), candidates, quality
+
+The request thread only samples and copies the input; the intermediates are
+produced by one background thread from a bounded queue (full queue = the
+capture is dropped). After every capture the oldest folders are deleted
+until the total fits the disk budget, so the folder is a ring buffer.
+
+Enable with BARCODE_CAPTURE_DIR; BARCODE_CAPTURE_RATE (0-1, default 0.05)
+and BARCODE_CAPTURE_BUDGET_MB (default 200) tune it.
+"""
+
+import os
+import json
+import logging
+import queue
+import random
+import shutil
+import threading
+from datetime import datetime
+
+import cv2
+
+from barcode_localizer import localize_barcodes, crop_candidate
+from jpeg_header import load_image
+from quality_gate import assess_quality
+from threshold_tuner import DEFAULT_LADDER, apply_strategy
+
+CAPTURE_DIR = os.environ.get('BARCODE_CAPTURE_DIR')
+CAPTURE_RATE = float(os.environ.get('BARCODE_CAPTURE_RATE', '0.05'))
+CAPTURE_BUDGET_MB = float(os.environ.get('BARCODE_CAPTURE_BUDGET_MB', '200'))
+QUEUE_SIZE = 8
+MAX_CROPS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def folder_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class FailureCapture:
+    """Bounded, sampled ring buffer of failed inputs and their intermediates"""
+
+    def __init__(self, root, rate=CAPTURE_RATE, budget_mb=CAPTURE_BUDGET_MB, queue_size=QUEUE_SIZE):
+        self.root = root
+        self.rate = rate
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.captured = 0
+        self.dropped = 0
+        self.evicted = 0
+        os.makedirs(root, exist_ok=True)
+
+    def submit(self, image_path, error, timings=None):
+        """Sample one failure; copies the input now and queues the rest. Returns True if kept"""
+        if random.random() >= self.rate:
+            return False
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        entry = os.path.join(self.root, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{stem}")
+        try:
+            os.makedirs(entry)
+            shutil.copyfile(image_path, os.path.join(entry, 'input' + os.path.splitext(image_path)[1].lower()))
+            self._queue.put_nowait((entry, os.path.basename(image_path), error, dict(timings or {})))
+        except queue.Full:
+            shutil.rmtree(entry, ignore_errors=True)
+            with self._lock:
+                self.dropped += 1
+            return False
+        except OSError as e:
+            logger.warning(f"Failure capture skipped: {e}")
+            shutil.rmtree(entry, ignore_errors=True)
+            return False
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='failure-capture', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            entry, source, error, timings = self._queue.get()
+            try:
+                self._write_artifacts(entry, source, error, timings)
+                with self._lock:
+                    self.captured += 1
+                self._enforce_budget()
+            except Exception as e:
+                logger.error(f"Failure capture of {source} failed: {type(e).__name__}: {e}")
+                shutil.rmtree(entry, ignore_errors=True)
+            finally:
+                self._queue.task_done()
+
+    def _write_artifacts(self, entry, source, error, timings):
+        input_path = next(os.path.join(entry, name) for name in os.listdir(entry) if name.startswith('input'))
+        image = load_image(input_path)
+        meta = {'source': source, 'error': error, 'timings_ms': timings,
+                'captured': datetime.now().isoformat(timespec='seconds')}
+        if image is not None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            cv2.imwrite(os.path.join(entry, 'gray.png'), gray)
+            for strategy in DEFAULT_LADDER:
+                cv2.imwrite(os.path.join(entry, f'threshold_{strategy.name}.png'), apply_strategy(strategy, gray))
+            candidates = localize_barcodes(gray, max_candidates=MAX_CROPS)
+            for i, candidate in enumerate(candidates):
+                cv2.imwrite(os.path.join(entry, f'crop_{i}.png'), crop_candidate(gray, candidate))
+            quality = assess_quality(image)
+            meta.update({
+                'shape': list(image.shape),
+                'candidates': [candidate._asdict() for candidate in candidates],
+                'quality': {'verdict': quality.verdict, 'metrics': quality.metrics},
+            })
+        with open(os.path.join(entry, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False, default=float)
+
+    def _enforce_budget(self):
+        """Delete the oldest finished captures until the folder fits the budget"""
+        entries = sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+        sizes = {name: folder_size(os.path.join(self.root, name)) for name in entries}
+        total = sum(sizes.values())
+        for name in entries:
+            if total <= self.budget_bytes:
+                break
+            # Queued captures (no meta.json yet) are still being written
+            if not os.path.exists(os.path.join(self.root, name, 'meta.json')):
+                continue
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            total -= sizes[name]
+            with self._lock:
+                self.evicted += 1
+
+    def wait(self):
+        """Block until the queued captures are written"""
+        self._queue.join()
+
+    def stats(self):
+        with self._lock:
+            return {'captured': self.captured, 'dropped': self.dropped, 'evicted': self.evicted,
+                    'queued': self._queue.qsize()}
+
+
+def capture_from_env():
+    """FailureCapture configured from BARCODE_CAPTURE_*, or None when disabled"""
+    if not CAPTURE_DIR or CAPTURE_RATE <= 0:
+        return None
+    return FailureCapture(CAPTURE_DIR)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reusable per-thread frame buffers
+บัฟเฟอร์ภาพที่จองไว้ใช้ซ้ำ เพื่อลดการจองหน่วยความจำกับภาพสแกนขนาดใหญ่
+
+OpenCV functions accept a dst= output array. Passing a buffer from
+frame_buffer() lets successive thresholds of the same frame size write into
+the same memory instead of allocating a new full frame every time.
+
+Buffers stay allocated until release_frame_buffers(), so callers release
+them once a file (or tile) is done; otherwise every server thread would keep
+the largest frame it has ever seen.
+"""
+
+import threading
+
+import numpy as np
+
+_local = threading.local()
+
+
+def frame_buffer(name, shape, dtype=np.uint8):
+    """Return this thread's buffer for name, reallocating only if the shape changes"""
+    buffers = getattr(_local, 'buffers', None)
+    if buffers is None:
+        buffers = _local.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+        buffer = buffers[name] = np.empty(shape, dtype=dtype)
+    return buffer
+
+
+def release_frame_buffers():
+    """Drop this thread's buffers (after each decoded file or tile)"""
+    _local.buffers = {}
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JPEG header parsing (EXIF orientation, embedded thumbnail, size)
+อ่านข้อมูลส่วนหัวของไฟล์ JPEG โดยไม่ต้องถอดรหัสภาพทั้งภาพ
+
+Only the marker segments before the compressed data are read, so this costs
+a few kilobytes of I/O. load_image() reads pixels with EXIF rotation turned
+off in OpenCV and applies the orientation itself, giving the same result as
+PIL's ImageOps.exif_transpose for color and grayscale reads alike.
+"""
+
+import struct
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+JpegHeader = namedtuple('JpegHeader', ['width', 'height', 'orientation', 'thumbnail'])
+
+NO_HEADER = JpegHeader(None, None, 1, None)
+
+ORIENTATION_TAG = 0x0112
+THUMBNAIL_OFFSET_TAG = 0x0201
+THUMBNAIL_LENGTH_TAG = 0x0202
+# SOF markers carry the frame size (all except DHT 0xC4, JPG 0xC8 and DAC 0xCC)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+MAX_HEADER_BYTES = 256 * 1024
+# Images at least this large also get a 1/4-size read in the fast path
+FAST_PATH_REDUCED_MIN_PIXELS = 8 * 1000 * 1000
+
+
+def _read_ifd(tiff, offset, endian):
+    """Return ({tag: value_or_offset}, next_ifd_offset) for one TIFF IFD"""
+    (count,) = struct.unpack_from(endian + 'H', tiff, offset)
+    entries = {}
+    for i in range(count):
+        tag, kind, _, value = struct.unpack_from(endian + 'HHI4s', tiff, offset + 2 + 12 * i)
+        if kind == 3:  # SHORT, stored left-aligned in the value field
+            value = struct.unpack_from(endian + 'H', value)[0]
+        else:
+            value = struct.unpack_from(endian + 'I', value)[0]
+        entries[tag] = value
+    (next_offset,) = struct.unpack_from(endian + 'I', tiff, offset + 2 + 12 * count)
+    return entries, next_offset
+
+
+def _parse_exif(tiff):
+    """(orientation, thumbnail_bytes) from the TIFF block of an Exif APP1 segment"""
+    endian = '<' if tiff[:2] == b'II' else '>'
+    (ifd0_offset,) = struct.unpack_from(endian + 'I', tiff, 4)
+    ifd0, ifd1_offset = _read_ifd(tiff, ifd0_offset, endian)
+    orientation = ifd0.get(ORIENTATION_TAG, 1)
+    thumbnail = None
+    if ifd1_offset:
+        ifd1, _ = _read_ifd(tiff, ifd1_offset, endian)
+        start = ifd1.get(THUMBNAIL_OFFSET_TAG)
+        length = ifd1.get(THUMBNAIL_LENGTH_TAG)
+        if start and length and start + length <= len(tiff):
+            thumbnail = bytes(tiff[start:start + length])
+    return (orientation if 1 <= orientation <= 8 else 1), thumbnail
+
+
+def read_jpeg_header(path):
+    """JpegHeader for a JPEG file; NO_HEADER fields for anything unreadable"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(MAX_HEADER_BYTES)
+    except OSError:
+        return NO_HEADER
+    if data[:2] != b'\xff\xd8':
+        return NO_HEADER
+
+    width = height = None
+    orientation, thumbnail = 1, None
+    pos = 2
+    try:
+        while pos + 4 <= len(data):
+            if data[pos] != 0xFF:
+                break
+            marker = data[pos + 1]
+            if marker == 0xFF:  # fill byte
+                pos += 1
+                continue
+            if marker == 0xDA or marker == 0xD9:  # start of scan / end of image
+                break
+            (length,) = struct.unpack_from('>H', data, pos + 2)
+            segment = data[pos + 4:pos + 2 + length]
+            if marker == 0xE1 and segment[:6] == b'Exif\x00\x00':
+                orientation, thumbnail = _parse_exif(segment[6:])
+            elif marker in SOF_MARKERS and len(segment) >= 5:
+                height, width = struct.unpack_from('>HH', segment, 1)
+                break
+            pos += 2 + length
+    except struct.error:
+        pass
+    return JpegHeader(width, height, orientation, thumbnail)
+
+
+def apply_orientation(image, orientation):
+    """Turn an image stored with an EXIF orientation (1-8) upright"""
+    if orientation == 2:
+        return cv2.flip(image, 1)
+    if orientation == 3:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(image, 0)
+    if orientation == 5:
+        return cv2.transpose(image)
+    if orientation == 6:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(image), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+
+def load_image(path, flags=cv2.IMREAD_COLOR, header=None):
+    """cv2.imread with the EXIF orientation applied explicitly (None if unreadable)"""
+    header = header or read_jpeg_header(path)
+    image = cv2.imread(path, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        return None
+    return apply_orientation(image, header.orientation)
+
+
+def decode_thumbnail(header):
+    """The embedded EXIF thumbnail as an upright grayscale image, or None"""
+    if not header.thumbnail:
+        return None
+    thumbnail = cv2.imdecode(np.frombuffer(header.thumbnail, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if thumbnail is None:
+        return None
+    return apply_orientation(thumbnail, header.orientation)
+
+
+def load_reduced(path, factor, header):
+    """Grayscale read at 1/factor size (2, 4 or 8) using libjpeg's DCT scaling"""
+    flags = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+             8: cv2.IMREAD_REDUCED_GRAYSCALE_8}[factor]
+    image = cv2.imread(path, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        return None
+    return apply_orientation(image, header.orientation)
+
+
+def decode_fast_path(path, header, decode, validate=None):
+    """Try decode(image) on the EXIF thumbnail, then on a 1/4-size read of a large JPEG
+
+    decode returns barcode text or None. Both images cost a fraction of a
+    full decode, so large, clearly printed barcodes are read almost for free.
+    """
+    attempts = [lambda: decode_thumbnail(header)]
+    if header.width and header.height and header.width * header.height >= FAST_PATH_REDUCED_MIN_PIXELS:
+        attempts.append(lambda: load_reduced(path, 4, header))
+    for attempt in attempts:
+        small = attempt()
+        if small is None:
+            continue
+        barcode_text = decode(small)
+        if barcode_text and (validate is None or validate(barcode_text)):
+            return barcode_text
+    return None
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Structured, non-blocking logging
+ตั้งค่า logging แบบ JSON ที่ไม่บล็อกเธรดที่กำลังอ่าน barcode
+
+configure_logging() routes every record through a QueueHandler on the root
+logger; a QueueListener thread formats and writes them, so decode threads
+never wait on the console. Records are one JSON object per line:
+
+    {"ts": "2026-10-19T14:25:01.123", "level": "ERROR", "logger": "app",
+     "msg": "...", "suppressed": 12}
+
+Environment:
+  BARCODE_LOG_LEVEL    root level (default INFO)
+  BARCODE_LOG_LEVELS   per-logger levels, e.g. "app=DEBUG,werkzeug=WARNING"
+  BARCODE_LOG_FORMAT   json (default) or text
+
+Warnings and errors are rate-limited per call site: at most ERROR_BURST
+records per ERROR_WINDOW seconds; the next record that gets through
+carries the number suppressed in between.
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+
+ERROR_BURST = 5
+ERROR_WINDOW = 60.0
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+_state = {'handler': None, 'listener': None}
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with extra= fields and the traceback if any"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues the record with its message rendered and the traceback as text in .exc"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = record.exc_text = None
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most burst WARNING+ records per window through for each call site"""
+
+    def __init__(self, burst=ERROR_BURST, window=ERROR_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._sites.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.burst:
+                self._sites[key] = (started, count, suppressed + 1)
+                return False
+            self._sites[key] = (started, count + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+def parse_levels(text):
+    """'app=DEBUG,werkzeug=WARNING' -> {'app': 'DEBUG', 'werkzeug': 'WARNING'}"""
+    levels = {}
+    for item in (text or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _start_listener(handler):
+    output = logging.StreamHandler(sys.stderr)
+    if os.environ.get('BARCODE_LOG_FORMAT', 'json') == 'text':
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    else:
+        output.setFormatter(JsonFormatter())
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+    listener.start()
+    _state['listener'] = listener
+
+
+def _restart_after_fork():
+    # The parent's listener thread does not exist in a forked child, and its
+    # queue lock may have been held at fork time: start over with a new queue
+    handler = _state['handler']
+    if handler is not None:
+        handler.queue = queue.SimpleQueue()
+        _start_listener(handler)
+        # multiprocessing children leave through os._exit, skipping atexit
+        import multiprocessing.util
+        multiprocessing.util.Finalize(None, _stop_listener, exitpriority=0)
+
+
+def _stop_listener():
+    listener = _state['listener']
+    if listener is not None:
+        listener.stop()
+        _state['listener'] = None
+
+
+def configure_logging(level=None):
+    """Install the queue handler on the root logger (idempotent)"""
+    with _lock:
+        if _state['handler'] is not None:
+            return
+        handler = _QueueHandler(queue.SimpleQueue())
+        handler.addFilter(RateLimitFilter())
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level or os.environ.get('BARCODE_LOG_LEVEL', 'INFO').upper())
+        for name, name_level in parse_levels(os.environ.get('BARCODE_LOG_LEVELS')).items():
+            logging.getLogger(name).setLevel(name_level)
+
+        _state['handler'] = handler
+        _start_listener(handler)
+        atexit.register(_stop_listener)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=_restart_after_fork)
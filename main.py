@@ -24,11 +24,18 @@ if __name__ == "__main__":
             print("Starting Web Barcode Reader...")
             from app import app
             app.run(host='0.0.0.0', port=5000, debug=True)
+        elif sys.argv[1] == "--batch" or sys.argv[1] == "-b":
+            # Run headless batch mode (no display needed)
+            from batch_runner import main as batch_main
+            sys.exit(batch_main(sys.argv[2:]))
         elif sys.argv[1] == "--help" or sys.argv[1] == "-h":
             print("Barcode Reader Application")
             print("Usage:")
-            print("  python main.py --desktop  # Run desktop GUI application")
+            print("  python main.py --desktop [--profile]")
+            print("                            # Run desktop GUI application (--profile: write a profile per run)")
             print("  python main.py --web      # Run web application")
+            print("  python main.py --batch PATHS [--workers N] [--policy suffix|skip|overwrite] [--profile]")
+            print("                            # Decode and rename without a GUI (JSON Lines output)")
             print("  python main.py --help     # Show this help message")
         else:
             print(f"Unknown argument: {sys.argv[1]}")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prometheus text-format metrics
+ตัวนับและ histogram สำหรับ endpoint /metrics ในรูปแบบ Prometheus
+
+    inc('barcode_decode_total', backend='pyzbar', outcome='success')
+    observe('barcode_decode_seconds', 0.42, backend='pyzbar')
+    set_gauge('barcode_upload_queue_depth', 3)
+    render()                              # exposition text
+
+Multi-process WSGI servers (gunicorn -w N): set BARCODE_METRICS_DIR to a
+directory shared by the workers and empty it before the server starts.
+Every worker then writes its own snapshot (metrics_<pid>.json) on flush(),
+at most once per FLUSH_INTERVAL seconds and once more at exit, and render()
+in whichever worker serves /metrics merges them: counters and histograms are
+summed over all snapshots, gauges only over workers that are still alive.
+Without the variable each process reports only itself.
+"""
+
+import os
+import json
+import math
+import time
+import atexit
+import threading
+
+METRICS_DIR = os.environ.get('BARCODE_METRICS_DIR')
+FLUSH_INTERVAL = 5.0
+
+# Seconds; a page decode ranges from a few ms (fast path) to tens of seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+
+_HELP = {}
+_TYPES = {}
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_pid = os.getpid()
+_last_flush = 0.0
+
+
+def describe(name, kind, help_text):
+    """Register the TYPE (counter, gauge, histogram) and HELP line of a metric"""
+    _TYPES[name] = kind
+    _HELP[name] = help_text
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _check_fork():
+    # A forked worker starts with its own, empty state
+    global _pid, _last_flush
+    if os.getpid() != _pid:
+        _pid = os.getpid()
+        _last_flush = 0.0
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        _check_fork()
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _check_fork()
+        _gauges[_key(name, labels)] = value
+
+
+def add_gauge(name, amount, **labels):
+    with _lock:
+        _check_fork()
+        key = _key(name, labels)
+        _gauges[key] = _gauges.get(key, 0) + amount
+
+
+def local_gauge(name, **labels):
+    """This process's current value of a gauge (0 if never set)"""
+    with _lock:
+        _check_fork()
+        return _gauges.get(_key(name, labels), 0)
+
+
+def observe(name, seconds, **labels):
+    """Add one observation to a histogram with DEFAULT_BUCKETS"""
+    with _lock:
+        _check_fork()
+        key = _key(name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * len(DEFAULT_BUCKETS), 0.0, 0]
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if seconds <= bound:
+                histogram[0][i] += 1
+                break
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+def _snapshot():
+    with _lock:
+        _check_fork()
+        return {
+            'pid': _pid,
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()],
+            'gauges': [[name, list(labels), value] for (name, labels), value in _gauges.items()],
+            'histograms': [[name, list(labels), list(h[0]), h[1], h[2]] for (name, labels), h in _histograms.items()],
+        }
+
+
+def flush(force=False):
+    """Write this process's snapshot into METRICS_DIR (no-op without it)
+
+    Unless force is set, a flush within FLUSH_INTERVAL seconds of the last
+    one is skipped.
+    """
+    global _last_flush
+    if not METRICS_DIR:
+        return
+    now = time.monotonic()
+    with _lock:
+        _check_fork()
+        if not force and now - _last_flush < FLUSH_INTERVAL:
+            return
+        _last_flush = now
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    snapshot = _snapshot()
+    path = os.path.join(METRICS_DIR, f"metrics_{snapshot['pid']}.json")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(temp_path, path)
+
+
+def _flush_at_exit():
+    flush(force=True)
+
+
+atexit.register(_flush_at_exit)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_snapshots():
+    """This process's live state plus the snapshots other workers flushed"""
+    own = _snapshot()
+    snapshots = [own]
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if not (name.startswith('metrics_') and name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(METRICS_DIR, name), 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if snapshot.get('pid') != own['pid']:
+                snapshot['alive'] = _pid_alive(snapshot.get('pid', 0))
+                snapshots.append(snapshot)
+    return snapshots
+
+
+def merged():
+    """(counters, gauges, histograms) summed over all worker snapshots"""
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in _load_snapshots():
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        if snapshot.get('alive', True):
+            for name, labels, value in snapshot['gauges']:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                gauges[key] = gauges.get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            histogram = histograms.setdefault(key, [[0] * len(DEFAULT_BUCKETS), 0.0, 0])
+            for i, value in enumerate(buckets):
+                histogram[0][i] += value
+            histogram[1] += total
+            histogram[2] += count
+    return counters, gauges, histograms
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(extra_gauges=None):
+    """Prometheus text exposition (format 0.0.4) of all metrics
+
+    extra_gauges is a list of (name, labels_dict, value) computed at scrape
+    time, such as directory sizes.
+    """
+    counters, gauges, histograms = merged()
+    for name, labels, value in extra_gauges or ():
+        gauges[_key(name, labels)] = value
+
+    families = {}
+    for (name, labels), value in sorted(counters.items()):
+        families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), value in sorted(gauges.items()):
+        families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        lines = families.setdefault(name, [])
+        cumulative = 0
+        for bound, value in zip(DEFAULT_BUCKETS, buckets):
+            cumulative += value
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    output = []
+    for name in sorted(families):
+        if name in _HELP:
+            output.append(f"# HELP {name} {_HELP[name]}")
+        if name in _TYPES:
+            output.append(f"# TYPE {name} {_TYPES[name]}")
+        output.extend(families[name])
+    return "\n".join(output) + "\n"
+
+
+def directory_usage(path):
+    """(file count, total bytes) of the regular files directly in path"""
+    files = size = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    files += 1
+                    size += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return files, size
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profiling of one decode batch
+บันทึกโปรไฟล์เวลาและหน่วยความจำของการประมวลผลหนึ่งชุด เพื่อส่งให้ทีมพัฒนา
+
+    with BatchProfiler(out_dir, 'batch') as profiler:
+        ...decode files...
+    profiler.paths        # files written
+
+Writes three files named <prefix>_<timestamp>.*:
+  .folded    sampled stacks of all threads, or only of thread_ids when given
+             (every SAMPLE_INTERVAL s), in the collapsed format of
+             flamegraph.pl, inferno and speedscope
+  .prof      cProfile of the calling thread (pstats, snakeviz)
+  _top.txt   top functions by cumulative time and the top-N allocation
+             sites from tracemalloc
+
+tracemalloc slows decoding down noticeably; profile a representative batch,
+not production traffic.
+"""
+
+import os
+import sys
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import tracemalloc
+from datetime import datetime
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.005
+TOP_N = 25
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler:
+    """Samples the Python stacks of all other threads (or only thread_ids) into collapsed-stack counts"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = frozenset(thread_ids) if thread_ids is not None else None
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (self.thread_ids is not None and ident not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def write_folded(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class BatchProfiler:
+    """Context manager: cProfile + stack sampling + tracemalloc around one batch
+
+    thread_ids limits the stack samples to those threads, e.g. a web request's
+    own thread so concurrent requests do not show up in its profile.
+    """
+
+    def __init__(self, out_dir, prefix='batch', top_n=TOP_N, interval=SAMPLE_INTERVAL, thread_ids=None):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.top_n = top_n
+        self.sampler = StackSampler(interval, thread_ids)
+        self.profile = cProfile.Profile()
+        self.paths = []
+        self._started_tracemalloc = False
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self.sampler.start()
+        self.started = time.perf_counter()
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        elapsed = time.perf_counter() - self.started
+        self.sampler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        try:
+            self._write(elapsed, snapshot, peak)
+        except OSError as e:
+            # A failed profile must not fail the batch it measured
+            logger.error(f"Could not write profile: {e}")
+        return False
+
+    def _write(self, elapsed, snapshot, peak):
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self.prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}")
+
+        self.sampler.write_folded(base + '.folded')
+        self.profile.dump_stats(base + '.prof')
+
+        with open(base + '_top.txt', 'w', encoding='utf-8') as f:
+            f.write(f"wall time: {elapsed:.3f} s, stack samples: {sum(self.sampler.counts.values())}, "
+                    f"traced peak: {peak / 1024 / 1024:.1f} MB\n\n")
+            f.write(f"== top {self.top_n} functions by cumulative time (calling thread) ==\n")
+            stats = pstats.Stats(self.profile, stream=f)
+            stats.sort_stats('cumulative').print_stats(self.top_n)
+            f.write(f"\n== top {self.top_n} allocation sites (still allocated at the end) ==\n")
+            for stat in snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ]).statistics('lineno')[:self.top_n]:
+                f.write(f"{stat}\n")
+        self.paths = [base + '.folded', base + '.prof', base + '_top.txt']
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cheap image-quality precheck
+ตรวจคุณภาพภาพแบบเร็วก่อนอ่าน barcode เพื่อปฏิเสธภาพที่อ่านไม่ได้แน่ ๆ ทันที
+
+The image is shrunk to QUALITY_SIZE pixels on its long side (strided, then
+INTER_AREA) and three metrics are measured on it in well under a
+millisecond:
+- contrast: standard deviation of the gray levels (blank pages are ~0)
+- sharpness: variance of the Laplacian (heavy blur is ~0)
+- edge density: fraction of Canny edge pixels (no structure at all is ~0)
+
+Each metric is compared with a hopeless and a marginal threshold scaled by
+the strictness level, which comes from BARCODE_QUALITY_GATE
+(off / lenient / normal / strict) unless given explicitly.
+"""
+
+import os
+from collections import namedtuple
+
+import cv2
+
+QualityReport = namedtuple('QualityReport', ['verdict', 'reason', 'metrics'])
+
+DECODABLE = 'decodable'
+MARGINAL = 'marginal'
+HOPELESS = 'hopeless'
+
+QUALITY_SIZE = 256
+# Long side the full frame is strided down to before the INTER_AREA resize
+PRESAMPLE_SIZE = 512
+
+STRICTNESS_SCALE = {'off': None, 'lenient': 0.5, 'normal': 1.0, 'strict': 2.0}
+DEFAULT_STRICTNESS = 'normal'
+
+# metric: (hopeless below, marginal below, reason), thresholds at 'normal'
+QUALITY_THRESHOLDS = [
+    ('contrast', 4.0, 10.0, "ภาพว่างเปล่าหรือสีแทบไม่ต่างกัน (contrast ต่ำเกินไป)"),
+    ('sharpness', 5.0, 30.0, "ภาพเบลอเกินกว่าจะอ่าน barcode ได้"),
+    ('edge_density', 0.002, 0.006, "ไม่พบลวดลายหรือเส้นขอบที่เป็น barcode ในภาพ"),
+]
+
+# Errors returned for images the gate rejected (no decode was attempted)
+REJECTION_REASONS = frozenset(reason for _, _, _, reason in QUALITY_THRESHOLDS)
+
+
+def current_strictness():
+    """Strictness from BARCODE_QUALITY_GATE (read per call so the CLI can set it)"""
+    strictness = os.environ.get('BARCODE_QUALITY_GATE', DEFAULT_STRICTNESS).strip().lower()
+    return strictness if strictness in STRICTNESS_SCALE else DEFAULT_STRICTNESS
+
+
+def quality_thumbnail(image, size=QUALITY_SIZE):
+    """Small grayscale copy of image for the quality metrics"""
+    height, width = image.shape[:2]
+    step = max(1, max(height, width) // PRESAMPLE_SIZE)
+    sampled = image[::step, ::step]
+    if len(sampled.shape) == 3:
+        sampled = cv2.cvtColor(sampled, cv2.COLOR_BGR2GRAY)
+    height, width = sampled.shape
+    scale = min(1.0, size / max(height, width))
+    return cv2.resize(sampled, (max(1, int(width * scale)), max(1, int(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+
+def measure_quality(small):
+    """Contrast, sharpness and edge density of a small grayscale image"""
+    _, contrast = cv2.meanStdDev(small)
+    _, laplacian_std = cv2.meanStdDev(cv2.Laplacian(small, cv2.CV_16S))
+    edges = cv2.Canny(small, 50, 150)
+    return {
+        'contrast': round(float(contrast[0][0]), 2),
+        'sharpness': round(float(laplacian_std[0][0]) ** 2, 2),
+        'edge_density': round(cv2.countNonZero(edges) / edges.size, 5),
+    }
+
+
+def assess_quality(image, strictness=None):
+    """Classify image as decodable, marginal or hopeless
+
+    Returns a QualityReport; reason is the Thai message for the first failed
+    metric (None when decodable). With strictness 'off' every image passes.
+    """
+    scale = STRICTNESS_SCALE.get(strictness or current_strictness())
+    if scale is None:
+        return QualityReport(DECODABLE, None, {})
+
+    metrics = measure_quality(quality_thumbnail(image))
+    marginal_reason = None
+    for name, hopeless_below, marginal_below, reason in QUALITY_THRESHOLDS:
+        if metrics[name] < hopeless_below * scale:
+            return QualityReport(HOPELESS, reason, metrics)
+        if marginal_reason is None and metrics[name] < marginal_below * scale:
+            marginal_reason = reason
+    if marginal_reason:
+        return QualityReport(MARGINAL, marginal_reason, metrics)
+    return QualityReport(DECODABLE, None, metrics)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Learned region prior
+จำตำแหน่ง barcode ที่อ่านสำเร็จในชุดไฟล์ แล้วลองอ่านตำแหน่งนั้นก่อนในภาพถัดไป
+
+Documents of one batch (or one profile) nearly always carry the barcode in
+the same place. Successful decodes are recorded as boxes in normalized
+coordinates (0..1 of width/height) so they carry over between scans of
+different resolution; later images try those regions first and only fall
+back to the full search on a miss.
+"""
+
+import threading
+
+# Boxes whose intersection-over-union exceeds this are the same region
+MERGE_IOU = 0.3
+MAX_REGIONS = 3
+# Extra margin around a learned region, as a fraction of the image size
+REGION_MARGIN = 0.03
+
+
+def _iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class RegionPrior:
+    """Normalized barcode boxes learned from successful decodes, with hit-rate counters"""
+
+    def __init__(self, max_regions=MAX_REGIONS, margin=REGION_MARGIN):
+        self.max_regions = max_regions
+        self.margin = margin
+        self._regions = []  # [x0, y0, x1, y1, hits]
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+
+    def record(self, rect, shape):
+        """Learn a pixel rect (x, y, w, h) found in an image of the given shape"""
+        height, width = shape[:2]
+        x, y, w, h = rect
+        if width <= 0 or height <= 0 or w <= 0 or h <= 0:
+            return
+        box = (x / width, y / height, (x + w) / width, (y + h) / height)
+        with self._lock:
+            for region in self._regions:
+                if _iou(region[:4], box) > MERGE_IOU:
+                    # Running average keeps the region centred on recent hits
+                    count = region[4]
+                    for i in range(4):
+                        region[i] = (region[i] * count + box[i]) / (count + 1)
+                    region[4] = count + 1
+                    break
+            else:
+                self._regions.append(list(box) + [1])
+            self._regions.sort(key=lambda region: -region[4])
+            del self._regions[self.max_regions:]
+
+    def pixel_boxes(self, shape):
+        """Learned regions (best first) as (x0, y0, x1, y1) pixel boxes with margin"""
+        height, width = shape[:2]
+        with self._lock:
+            regions = [tuple(region[:4]) for region in self._regions]
+        boxes = []
+        for x0, y0, x1, y1 in regions:
+            boxes.append((
+                max(0, int((x0 - self.margin) * width)),
+                max(0, int((y0 - self.margin) * height)),
+                min(width, int((x1 + self.margin) * width) + 1),
+                min(height, int((y1 + self.margin) * height) + 1),
+            ))
+        return boxes
+
+    def note_attempt(self, hit):
+        with self._lock:
+            self.attempts += 1
+            self.hits += int(hit)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'regions': len(self._regions),
+                'attempts': self.attempts,
+                'hits': self.hits,
+                'hit_rate': round(self.hits / self.attempts, 3) if self.attempts else None,
+            }
+
+
+def decode_with_prior(image, decode, prior=None):
+    """Try the prior's regions, then the full image
+
+    decode(image) returns (barcode_text, error, rect) where rect is an
+    (x, y, w, h) box in that image or None. Returns the same triple for the
+    full image, plus whether a learned region produced the result.
+    """
+    boxes = prior.pixel_boxes(image.shape) if prior is not None else []
+    for x0, y0, x1, y1 in boxes:
+        barcode_text, error, rect = decode(image[y0:y1, x0:x1])
+        if barcode_text:
+            rect = (rect[0] + x0, rect[1] + y0, rect[2], rect[3]) if rect else (x0, y0, x1 - x0, y1 - y0)
+            prior.note_attempt(True)
+            prior.record(rect, image.shape)
+            return barcode_text, error, rect, True
+    if boxes:
+        prior.note_attempt(False)
+
+    barcode_text, error, rect = decode(image)
+    if barcode_text and rect and prior is not None:
+        prior.record(rect, image.shape)
+    return barcode_text, error, rect, False
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Planned batch rename with journal and undo
+วางแผนการเปลี่ยนชื่อไฟล์ทั้งชุด แล้วเปลี่ยนชื่อในรอบเดียวพร้อม journal สำหรับย้อนกลับ
+
+Phase 1 (build_rename_plan): compute every target name up front, resolving
+collisions with a policy instead of asking the user from the worker thread.
+Phase 2 (apply_rename_plan): rename in one pass. Every step is recorded in an
+append-only JSON Lines journal so a batch can be undone, and a batch that was
+interrupted by a crash can be rolled back the next time the program starts.
+
+While a batch is applied (or rolled back) its journal is held under an
+exclusive JournalLock; recovery skips journals whose lock is held, so a
+second desktop window or a running `main.py --batch` is never undone from
+under it. The OS releases the lock when the holding process dies.
+"""
+
+import os
+import json
+import time
+import uuid
+
+# Collision policies
+COLLISION_SUFFIX = 'suffix'        # ARHZ43I03901_1.jpg, ARHZ43I03901_2.jpg, ...
+COLLISION_SKIP = 'skip'            # keep the original name
+COLLISION_OVERWRITE = 'overwrite'  # replace the existing file (kept as backup)
+COLLISION_POLICIES = (COLLISION_SUFFIX, COLLISION_SKIP, COLLISION_OVERWRITE)
+
+# Per-user journal folder
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.barcode_reader', 'journals')
+JOURNAL_SUFFIX = '.jsonl'
+KEEP_JOURNALS = 10
+
+
+class RenameOp:
+    """One planned rename"""
+
+    def __init__(self, src, dst, status='pending', reason=None):
+        self.src = src
+        self.dst = dst
+        self.status = status  # pending, unchanged, skipped, done, failed
+        self.reason = reason
+        self.backup = None
+
+    def to_dict(self):
+        return {
+            'src': self.src,
+            'dst': self.dst,
+            'status': self.status,
+            'reason': self.reason,
+            'backup': self.backup,
+        }
+
+
+def _norm(path):
+    """Normalize a path for collision checks (case-insensitive on Windows)"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+def build_rename_plan(items, policy=COLLISION_SUFFIX):
+    """Build a complete rename plan
+
+    items: iterable of (source_path, new_stem) where new_stem is the cleaned
+    barcode text without extension. Returns a list of RenameOp.
+    """
+    if policy not in COLLISION_POLICIES:
+        raise ValueError(f"Unknown collision policy: {policy}")
+
+    items = list(items)
+    sources = {_norm(src) for src, _ in items}
+    claimed = set()
+    plan = []
+
+    for src, stem in items:
+        directory = os.path.dirname(src)
+        _, ext = os.path.splitext(src)
+        dst = os.path.join(directory, f"{stem}{ext}")
+
+        if _norm(dst) == _norm(src):
+            op = RenameOp(src, dst, status='unchanged', reason='ชื่อไฟล์ถูกต้องอยู่แล้ว')
+            claimed.add(_norm(dst))
+            plan.append(op)
+            continue
+
+        def taken(path):
+            key = _norm(path)
+            # A file that is itself being renamed in this batch still occupies
+            # its name until it moves, so it counts as taken too
+            return key in claimed or os.path.exists(path) or key in sources
+
+        if taken(dst):
+            if policy == COLLISION_SKIP:
+                plan.append(RenameOp(src, dst, status='skipped',
+                                     reason=f"ไฟล์ {os.path.basename(dst)} มีอยู่แล้ว"))
+                continue
+            if policy == COLLISION_SUFFIX or _norm(dst) in claimed or _norm(dst) in sources:
+                # Overwrite never replaces a file produced or moved by this batch
+                counter = 1
+                candidate = os.path.join(directory, f"{stem}_{counter}{ext}")
+                while taken(candidate):
+                    counter += 1
+                    candidate = os.path.join(directory, f"{stem}_{counter}{ext}")
+                dst = candidate
+
+        claimed.add(_norm(dst))
+        plan.append(RenameOp(src, dst))
+
+    return plan
+
+
+class JournalLock:
+    """Exclusive, non-blocking lock on a journal (a .lock file next to it)"""
+
+    def __init__(self, journal_path):
+        self.path = journal_path + '.lock'
+        self._file = None
+
+    def acquire(self):
+        """Take the lock; False if another holder (process or handle) has it"""
+        lock_file = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        # The .lock file stays until prune_journals removes the journal, so
+        # two processes never lock different files for the same journal
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RenameJournal:
+    """Append-only JSON Lines journal for one batch"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @classmethod
+    def create(cls, journal_dir=None):
+        journal_dir = journal_dir or DEFAULT_JOURNAL_DIR
+        os.makedirs(journal_dir, exist_ok=True)
+        batch_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        return cls(os.path.join(journal_dir, f"batch_{batch_id}{JOURNAL_SUFFIX}"))
+
+    def open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def append(self, record, sync=False):
+        record = dict(record, ts=time.time())
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self):
+        """Read all records, ignoring a torn last line from a crash"""
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        return records
+
+
+def _backup_path(path, batch_name):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{batch_name}.bak")
+
+
+def apply_rename_plan(plan, journal_dir=None):
+    """Apply a rename plan in one pass, journaling every step
+
+    The intents for the whole batch are written and synced once before any
+    file is touched; each completed rename is then appended without fsync so
+    the pass stays fast. Recovery works from the intents plus what is on disk.
+    Returns (plan, journal_path).
+    """
+    pending = [op for op in plan if op.status == 'pending']
+    if not pending:
+        return plan, None
+
+    journal = RenameJournal.create(journal_dir)
+    lock = JournalLock(journal.path)
+    lock.acquire()
+    journal.open()
+    batch_name = os.path.splitext(os.path.basename(journal.path))[0]
+    try:
+        journal.append({'op': 'begin', 'count': len(pending)})
+        for op in pending:
+            if os.path.exists(op.dst):
+                op.backup = _backup_path(op.dst, batch_name)
+            journal.append({'op': 'intent', 'src': op.src, 'dst': op.dst, 'backup': op.backup})
+        journal.append({'op': 'planned'}, sync=True)
+
+        for op in pending:
+            try:
+                if op.backup:
+                    os.replace(op.dst, op.backup)
+                    journal.append({'op': 'backup', 'src': op.dst, 'dst': op.backup})
+                os.replace(op.src, op.dst)
+                op.status = 'done'
+                journal.append({'op': 'done', 'src': op.src, 'dst': op.dst})
+            except OSError as e:
+                op.status = 'failed'
+                op.reason = str(e)
+                journal.append({'op': 'failed', 'src': op.src, 'dst': op.dst, 'error': str(e)})
+
+        journal.append({'op': 'commit'}, sync=True)
+    finally:
+        journal.close()
+        lock.release()
+
+    prune_journals(os.path.dirname(journal.path))
+    return plan, journal.path
+
+
+def rollback_journal(journal_path):
+    """Undo every rename recorded in a journal, newest first
+
+    Returns (restored_count, errors).
+    """
+    lock = JournalLock(journal_path)
+    if not lock.acquire():
+        return 0, [f"{os.path.basename(journal_path)}: ชุดนี้กำลังถูกเปลี่ยนชื่อโดยโปรแกรมอื่น"]
+    try:
+        return _rollback_locked(journal_path)
+    finally:
+        lock.release()
+
+
+def _rollback_locked(journal_path):
+    journal = RenameJournal(journal_path)
+    records = journal.read()
+    if any(r.get('op') == 'rolled_back' for r in records):
+        return 0, []
+
+    intents = [r for r in records if r.get('op') == 'intent']
+    restored = 0
+    errors = []
+
+    for intent in reversed(intents):
+        src, dst, backup = intent['src'], intent['dst'], intent.get('backup')
+        try:
+            # Undo the rename only if it actually happened
+            if os.path.exists(dst) and not os.path.exists(src):
+                os.replace(dst, src)
+                restored += 1
+            if backup and os.path.exists(backup) and not os.path.exists(dst):
+                os.replace(backup, dst)
+        except OSError as e:
+            errors.append(f"{os.path.basename(dst)}: {e}")
+
+    journal.open()
+    try:
+        journal.append({'op': 'rolled_back', 'restored': restored, 'errors': len(errors)}, sync=True)
+    finally:
+        journal.close()
+    return restored, errors
+
+
+def journal_state(journal_path):
+    """Return 'committed', 'rolled_back' or 'incomplete'"""
+    ops = {r.get('op') for r in RenameJournal(journal_path).read()}
+    if 'rolled_back' in ops:
+        return 'rolled_back'
+    if 'commit' in ops:
+        return 'committed'
+    return 'incomplete'
+
+
+def list_journals(journal_dir=None):
+    """List journal files, newest first"""
+    journal_dir = journal_dir or DEFAULT_JOURNAL_DIR
+    if not os.path.isdir(journal_dir):
+        return []
+    names = [n for n in os.listdir(journal_dir) if n.endswith(JOURNAL_SUFFIX)]
+    names.sort(reverse=True)
+    return [os.path.join(journal_dir, n) for n in names]
+
+
+def latest_undoable_journal(journal_dir=None):
+    """Most recent committed batch that has not been undone"""
+    for path in list_journals(journal_dir):
+        if journal_state(path) == 'committed':
+            return path
+    return None
+
+
+def recover_incomplete_journals(journal_dir=None):
+    """Roll back batches that were interrupted before commit
+
+    Journals locked by a live process are still being applied and are left
+    alone. Returns a list of (journal_path, restored_count, errors).
+    """
+    recovered = []
+    for path in list_journals(journal_dir):
+        if journal_state(path) != 'incomplete':
+            continue
+        lock = JournalLock(path)
+        if not lock.acquire():
+            continue
+        try:
+            # The batch may have committed since the first check
+            if journal_state(path) == 'incomplete':
+                restored, errors = _rollback_locked(path)
+                recovered.append((path, restored, errors))
+        finally:
+            lock.release()
+    return recovered
+
+
+def prune_journals(journal_dir=None, keep=KEEP_JOURNALS):
+    """Delete old finished journals together with their overwrite backups"""
+    for path in list_journals(journal_dir)[keep:]:
+        if journal_state(path) == 'incomplete':
+            continue
+        for record in RenameJournal(path).read():
+            backup = record.get('backup')
+            if record.get('op') == 'intent' and backup and os.path.exists(backup):
+                try:
+                    os.remove(backup)
+                except OSError:
+                    pass
+        for name in (path, JournalLock(path).path):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight timing spans
+วัดเวลาของแต่ละขั้นตอน (span) ภายใน request และต่อไฟล์
+
+    with start_trace() as trace:          # one per request
+        with start_trace() as timings:    # one per uploaded file
+            with span('imread'):
+                ...
+    trace.server_timing()                 # "imread;dur=12.3, ..."
+
+begin_trace()/end_trace() do the same for code that cannot use a with
+block, such as Flask before/after request hooks.
+
+Spans add their duration to every active trace (request and file), to
+process-wide aggregates (count, total, max) that aggregate_snapshot()
+exports, and to any add_observer() callbacks. The active traces live in a
+ContextVar, so concurrent requests do not mix. With BARCODE_TIMING=0, span()
+returns a shared no-op object and costs one global lookup. The web app sends
+the request trace as a Server-Timing header only when BARCODE_SERVER_TIMING=1
+or in debug mode.
+"""
+
+import os
+import re
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+TIMING_ENABLED = os.environ.get('BARCODE_TIMING', '1') == '1'
+
+_active_traces = ContextVar('barcode_active_traces', default=())
+_aggregates = {}
+_aggregates_lock = threading.Lock()
+_observers = []
+
+
+class Trace:
+    """Accumulated span durations (seconds) by name, in first-seen order"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def as_ms(self):
+        return {name: round(seconds * 1000, 2) for name, seconds in self.durations.items()}
+
+    def server_timing(self, total_name='total'):
+        """Server-Timing header value, with the trace's own wall time as total"""
+        metrics = [f"{_token(name)};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()]
+        metrics.append(f"{total_name};dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(metrics)
+
+
+def _token(name):
+    # Server-Timing metric names are HTTP tokens: no spaces or separators
+    return re.sub(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]", '_', name)
+
+
+class _Span:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        for trace in _active_traces.get():
+            trace.add(self.name, seconds)
+        with _aggregates_lock:
+            aggregate = _aggregates.get(self.name)
+            if aggregate is None:
+                _aggregates[self.name] = [1, seconds, seconds]
+            else:
+                aggregate[0] += 1
+                aggregate[1] += seconds
+                if seconds > aggregate[2]:
+                    aggregate[2] = seconds
+        for observer in _observers:
+            observer(self.name, seconds)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing one stage"""
+    if not TIMING_ENABLED:
+        return _NO_SPAN
+    return _Span(name)
+
+
+def begin_trace():
+    """Start collecting spans into a new Trace; returns (trace, token for end_trace)"""
+    trace = Trace()
+    return trace, _active_traces.set(_active_traces.get() + (trace,))
+
+
+def end_trace(token):
+    _active_traces.reset(token)
+
+
+@contextmanager
+def start_trace():
+    """Collect spans of the enclosed code into a new Trace (outer traces still get them)"""
+    trace, token = begin_trace()
+    try:
+        yield trace
+    finally:
+        end_trace(token)
+
+
+def aggregate_snapshot():
+    """{name: {'count', 'total_s', 'max_s'}} of every span since start (or reset)"""
+    with _aggregates_lock:
+        return {
+            name: {'count': count, 'total_s': round(total, 6), 'max_s': round(maximum, 6)}
+            for name, (count, total, maximum) in _aggregates.items()
+        }
+
+
+def add_observer(observer):
+    """Call observer(name, seconds) for every finished span, e.g. for histograms"""
+    _observers.append(observer)
+
+
+def reset_aggregates():
+    with _aggregates_lock:
+        _aggregates.clear()
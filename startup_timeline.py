@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup timeline logging
+บันทึกลำดับเวลาตอนเปิดโปรแกรม เพื่อให้เห็นเมื่อการเปิดโปรแกรมช้าลง
+
+Each mark records the seconds since the timeline was created. finish() logs
+the timeline and appends it as one JSON line to
+~/.barcode_reader/startup.log so regressions can be compared across builds.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+
+STARTUP_LOG_PATH = os.path.join(os.path.expanduser('~'), '.barcode_reader', 'startup.log')
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimeline:
+    """Collects (name, seconds_since_start) marks"""
+
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self.started = time.perf_counter()
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, round(time.perf_counter() - self.started, 4)))
+
+    def finish(self, log_path=STARTUP_LOG_PATH):
+        """Log the timeline and append it to the startup log"""
+        summary = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.marks)
+        logger.info(f"Startup timeline ({self.app_name}): {summary}")
+
+        record = {
+            'app': self.app_name,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'frozen': bool(getattr(sys, 'frozen', False)),
+            'marks': dict(self.marks),
+        }
+        try:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass
+        return record
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent hit-rate statistics of the decode strategies
+สถิติว่าวิธีอ่าน barcode แต่ละวิธี (raw, threshold, OpenCV fallback) สำเร็จบ่อยแค่ไหนและใช้เวลาเท่าไร
+
+Every attempt of a decode cascade is recorded under a strategy name
+('raw', the threshold ladder names such as 'otsu' or 'gaussian_11_2', and
+the OpenCV fallback methods 'fallback_otsu', 'fallback_adaptive' and, in
+the web app, 'fallback_morph_otsu' and 'fallback_canny'): wins, losses, and
+the time spent on each. The desktop/batch engine and the web app keep
+separate totals (engine 'engine' and 'web'). The unit is one attempt on one image region, not one file: a file
+whose learned-region crop, full page and deskewed crops are tried counts
+'raw' once for each of them. Counts are kept in memory and added to a
+per-user SQLite database on flush(), so restarts and parallel batch workers
+accumulate into the same totals.
+
+Expected value of a strategy = wins per second spent trying it. With
+BARCODE_PRUNE_MIN_VALUE set, should_skip() skips strategies below that value
+once they have MIN_ATTEMPTS attempts; a small EXPLORE_RATE of calls still
+tries them so the statistics can recover. 'raw' is never skipped.
+"""
+
+import os
+import time
+import random
+import sqlite3
+import threading
+
+DEFAULT_STATS_PATH = os.path.join(os.path.expanduser('~'), '.barcode_reader', 'strategy_stats.sqlite3')
+BUSY_TIMEOUT = 30.0
+WRITE_RETRIES = 5
+
+# Pruning policy; off unless BARCODE_PRUNE_MIN_VALUE (wins per second) is set
+PRUNE_MIN_VALUE = float(os.environ['BARCODE_PRUNE_MIN_VALUE']) if os.environ.get('BARCODE_PRUNE_MIN_VALUE') else None
+MIN_ATTEMPTS = 100
+EXPLORE_RATE = 0.02
+NEVER_SKIP = frozenset({'raw'})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS strategy_stats (
+    strategy TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    wins INTEGER NOT NULL,
+    losses INTEGER NOT NULL,
+    win_seconds REAL NOT NULL,
+    loss_seconds REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (strategy, engine)
+);
+"""
+
+
+class StrategyStats:
+    """Win/loss counts and timings per decode strategy, persisted in SQLite
+
+    The totals loaded at start (plus this process's unflushed attempts) drive
+    should_skip(); other processes' attempts are seen after the next load().
+    """
+
+    def __init__(self, db_path=None, engine='default', min_value=PRUNE_MIN_VALUE,
+                 min_attempts=MIN_ATTEMPTS, explore_rate=EXPLORE_RATE):
+        self.db_path = db_path or DEFAULT_STATS_PATH
+        self.engine = engine
+        self.min_value = min_value
+        self.min_attempts = min_attempts
+        self.explore_rate = explore_rate
+        self._lock = threading.Lock()
+        self._stored = {}
+        self._pending = {}
+        self.skipped = {}
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._execute_write(lambda conn: conn.executescript(_SCHEMA))
+        self.load()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _execute_write(self, operation):
+        """Run a write in its own transaction, retrying while another process holds the lock"""
+        for attempt in range(WRITE_RETRIES):
+            conn = self._connect()
+            try:
+                with conn:
+                    return operation(conn)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+            finally:
+                conn.close()
+
+    def load(self):
+        """Re-read the persisted totals"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT strategy, wins, losses, win_seconds, loss_seconds FROM strategy_stats WHERE engine = ?",
+                (self.engine,)
+            ).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            self._stored = {row[0]: list(row[1:]) for row in rows}
+
+    def record(self, strategy, success, seconds):
+        """Record one attempt of a strategy"""
+        with self._lock:
+            counts = self._pending.setdefault(strategy, [0, 0, 0.0, 0.0])
+            if success:
+                counts[0] += 1
+                counts[2] += seconds
+            else:
+                counts[1] += 1
+                counts[3] += seconds
+
+    def flush(self):
+        """Add the unflushed attempts to the database"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for strategy, counts in pending.items():
+                stored = self._stored.setdefault(strategy, [0, 0, 0.0, 0.0])
+                for i, value in enumerate(counts):
+                    stored[i] += value
+        if not pending:
+            return
+        now = time.time()
+
+        def write(conn):
+            for strategy, (wins, losses, win_seconds, loss_seconds) in pending.items():
+                conn.execute(
+                    "INSERT INTO strategy_stats "
+                    "(strategy, engine, wins, losses, win_seconds, loss_seconds, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (strategy, engine) DO UPDATE SET "
+                    "wins = wins + excluded.wins, losses = losses + excluded.losses, "
+                    "win_seconds = win_seconds + excluded.win_seconds, "
+                    "loss_seconds = loss_seconds + excluded.loss_seconds, updated = excluded.updated",
+                    (strategy, self.engine, wins, losses, win_seconds, loss_seconds, now)
+                )
+        self._execute_write(write)
+
+    def _totals(self, strategy):
+        stored = self._stored.get(strategy, (0, 0, 0.0, 0.0))
+        pending = self._pending.get(strategy, (0, 0, 0.0, 0.0))
+        return [a + b for a, b in zip(stored, pending)]
+
+    def expected_value(self, strategy):
+        """Wins per second spent on the strategy, or None before any attempt"""
+        with self._lock:
+            wins, losses, win_seconds, loss_seconds = self._totals(strategy)
+        seconds = win_seconds + loss_seconds
+        if wins + losses == 0:
+            return None
+        return wins / seconds if seconds > 0 else float(wins > 0)
+
+    def should_skip(self, strategy):
+        """True when the pruning policy drops this strategy for the next attempt"""
+        if self.min_value is None or strategy in NEVER_SKIP:
+            return False
+        with self._lock:
+            wins, losses, win_seconds, loss_seconds = self._totals(strategy)
+        if wins + losses < self.min_attempts:
+            return False
+        seconds = win_seconds + loss_seconds
+        value = wins / seconds if seconds > 0 else float(wins > 0)
+        if value >= self.min_value or random.random() < self.explore_rate:
+            return False
+        with self._lock:
+            self.skipped[strategy] = self.skipped.get(strategy, 0) + 1
+        return True
+
+    def summary(self):
+        """{strategy: counts, hit rate, mean win/loss time, expected value}, best value first"""
+        with self._lock:
+            names = set(self._stored) | set(self._pending)
+            rows = {name: self._totals(name) for name in names}
+            skipped = dict(self.skipped)
+        result = {}
+        for name, (wins, losses, win_seconds, loss_seconds) in rows.items():
+            attempts = wins + losses
+            seconds = win_seconds + loss_seconds
+            result[name] = {
+                'attempts': attempts,
+                'wins': wins,
+                'hit_rate': round(wins / attempts, 4) if attempts else None,
+                'mean_win_ms': round(win_seconds / wins * 1000, 2) if wins else None,
+                'mean_loss_ms': round(loss_seconds / losses * 1000, 2) if losses else None,
+                'wins_per_s': round(wins / seconds, 3) if seconds > 0 else None,
+                'skipped': skipped.get(name, 0),
+            }
+        return dict(sorted(result.items(), key=lambda item: -(item[1]['wins_per_s'] or 0)))
+
+    def reset(self):
+        """Forget all statistics of this engine"""
+        with self._lock:
+            self._stored.clear()
+            self._pending.clear()
+            self.skipped.clear()
+        self._execute_write(lambda conn: conn.execute(
+            "DELETE FROM strategy_stats WHERE engine = ?", (self.engine,)
+        ))
+
+
+def timed_attempt(stats, name, attempt):
+    """Run attempt() unless the pruning policy skips it; record the outcome in stats"""
+    if stats is None:
+        return attempt()
+    if stats.should_skip(name):
+        return None
+    started = time.perf_counter()
+    result = attempt()
+    stats.record(name, bool(result), time.perf_counter() - started)
+    return result
@@ -0,0 +1,125 @@
+"""Rename planning, journaled apply, undo and crash recovery (rename_plan.py)"""
+
+import os
+
+import pytest
+
+from rename_plan import (
+    COLLISION_SUFFIX, COLLISION_SKIP, COLLISION_OVERWRITE,
+    JournalLock, RenameJournal, build_rename_plan, apply_rename_plan,
+    rollback_journal, journal_state, recover_incomplete_journals,
+)
+
+
+def make_files(folder, *names):
+    paths = []
+    for name in names:
+        path = folder / name
+        path.write_text(name, encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def names(folder):
+    return sorted(p.name for p in folder.iterdir())
+
+
+def write_interrupted_journal(journal_dir, renames):
+    """A journal as left by a crash after the renames but before commit"""
+    journal = RenameJournal.create(str(journal_dir)).open()
+    journal.append({'op': 'begin', 'count': len(renames)})
+    for src, dst in renames:
+        journal.append({'op': 'intent', 'src': src, 'dst': dst, 'backup': None})
+    journal.append({'op': 'planned'})
+    for src, dst in renames:
+        os.replace(src, dst)
+        journal.append({'op': 'done', 'src': src, 'dst': dst})
+    journal.close()
+    return journal.path
+
+
+def test_suffix_policy_numbers_duplicates_and_existing_files(tmp_path):
+    a, b = make_files(tmp_path, 'a.jpg', 'b.jpg')
+    make_files(tmp_path, 'CODE.jpg')
+    plan = build_rename_plan([(a, 'CODE'), (b, 'CODE')], COLLISION_SUFFIX)
+    assert [os.path.basename(op.dst) for op in plan] == ['CODE_1.jpg', 'CODE_2.jpg']
+    assert all(op.status == 'pending' for op in plan)
+
+
+def test_source_names_count_as_taken(tmp_path):
+    a, b = make_files(tmp_path, 'a.jpg', 'b.jpg')
+    # b.jpg is renamed in the same batch, but still holds its name when a moves
+    plan = build_rename_plan([(a, 'b'), (b, 'c')], COLLISION_SUFFIX)
+    assert os.path.basename(plan[0].dst) == 'b_1.jpg'
+
+
+def test_skip_policy_and_unchanged_names(tmp_path):
+    a, same = make_files(tmp_path, 'a.jpg', 'CODE2.jpg')
+    make_files(tmp_path, 'CODE.jpg')
+    plan = build_rename_plan([(a, 'CODE'), (same, 'CODE2')], COLLISION_SKIP)
+    assert [op.status for op in plan] == ['skipped', 'unchanged']
+
+
+def test_overwrite_keeps_a_backup_that_undo_restores(tmp_path):
+    journal_dir = tmp_path / 'journals'
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    a, = make_files(photos, 'a.jpg')
+    make_files(photos, 'CODE.jpg')
+    plan, journal_path = apply_rename_plan(build_rename_plan([(a, 'CODE')], COLLISION_OVERWRITE),
+                                           str(journal_dir))
+    assert plan[0].status == 'done'
+    assert (photos / 'CODE.jpg').read_text(encoding='utf-8') == 'a.jpg'
+    assert journal_state(journal_path) == 'committed'
+
+    restored, errors = rollback_journal(journal_path)
+    assert (restored, errors) == (1, [])
+    assert (photos / 'a.jpg').read_text(encoding='utf-8') == 'a.jpg'
+    assert (photos / 'CODE.jpg').read_text(encoding='utf-8') == 'CODE.jpg'
+    assert journal_state(journal_path) == 'rolled_back'
+    # A second undo is a no-op
+    assert rollback_journal(journal_path) == (0, [])
+
+
+def test_recovery_rolls_back_an_interrupted_batch(tmp_path):
+    journal_dir = tmp_path / 'journals'
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    a, b = make_files(photos, 'a.jpg', 'b.jpg')
+    journal_path = write_interrupted_journal(journal_dir, [(a, str(photos / 'X.jpg')), (b, str(photos / 'Y.jpg'))])
+    assert journal_state(journal_path) == 'incomplete'
+
+    recovered = recover_incomplete_journals(str(journal_dir))
+    assert recovered == [(journal_path, 2, [])]
+    assert names(photos) == ['a.jpg', 'b.jpg']
+    assert journal_state(journal_path) == 'rolled_back'
+
+
+def test_recovery_leaves_a_batch_that_is_still_being_applied(tmp_path):
+    journal_dir = tmp_path / 'journals'
+    photos = tmp_path / 'photos'
+    photos.mkdir()
+    a, = make_files(photos, 'a.jpg')
+    journal_path = write_interrupted_journal(journal_dir, [(a, str(photos / 'X.jpg'))])
+
+    # Another program holds the journal while it renames
+    live = JournalLock(journal_path)
+    assert live.acquire()
+    try:
+        assert recover_incomplete_journals(str(journal_dir)) == []
+        restored, errors = rollback_journal(journal_path)
+        assert restored == 0 and len(errors) == 1
+        assert names(photos) == ['X.jpg']
+        assert journal_state(journal_path) == 'incomplete'
+    finally:
+        live.release()
+
+    # Once the holder is gone the batch counts as abandoned
+    assert recover_incomplete_journals(str(journal_dir)) == [(journal_path, 1, [])]
+    assert names(photos) == ['a.jpg']
+
+
+def test_unknown_policy_is_rejected(tmp_path):
+    a, = make_files(tmp_path, 'a.jpg')
+    with pytest.raises(ValueError):
+        build_rename_plan([(a, 'CODE')], 'rename-everything')
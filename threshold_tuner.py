@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-batch auto-tuning of the threshold ladder
+ปรับลำดับวิธี threshold ให้เหมาะกับเครื่องสแกน/แสงของแต่ละชุดไฟล์
+
+Without a tuner the ladder is the classic one: Otsu, then adaptive Gaussian
+and adaptive mean with blockSize 11 and C 2, stopping at the first decode.
+With a ThresholdTuner the first calibration_runs ladder runs try the whole
+strategy grid and record which strategies decode and how long they take.
+Afterwards only the strategies that worked are tried, most successful and
+fastest first. If the tuned ladder's hit rate over the last window runs
+drops below recalibrate_below, the tuner calibrates again.
+
+Calibration runs the whole grid on every file, so it only pays off on
+batches of at least MIN_TUNED_BATCH files (tuner_for_batch); smaller
+batches use the classic ladder.
+"""
+
+import time
+import threading
+from collections import deque, namedtuple
+
+import cv2
+
+ThresholdStrategy = namedtuple('ThresholdStrategy', ['name', 'method', 'block_size', 'c'])
+
+OTSU = 'otsu'
+ADAPTIVE_GAUSSIAN = 'adaptive_gaussian'
+ADAPTIVE_MEAN = 'adaptive_mean'
+
+DEFAULT_LADDER = [
+    ThresholdStrategy('otsu', OTSU, None, None),
+    ThresholdStrategy('gaussian_11_2', ADAPTIVE_GAUSSIAN, 11, 2),
+    ThresholdStrategy('mean_11_2', ADAPTIVE_MEAN, 11, 2),
+]
+
+STRATEGY_GRID = DEFAULT_LADDER + [
+    ThresholdStrategy(f'{prefix}_{block_size}_{c}', method, block_size, c)
+    for method, prefix in ((ADAPTIVE_GAUSSIAN, 'gaussian'), (ADAPTIVE_MEAN, 'mean'))
+    for block_size in (11, 21, 31)
+    for c in (2, 5, 10)
+    if (block_size, c) != (11, 2)
+]
+
+CALIBRATION_RUNS = 8
+KEEP_STRATEGIES = 3
+RECALIBRATE_WINDOW = 20
+RECALIBRATE_BELOW = 0.5
+MIN_TUNED_BATCH = 4 * CALIBRATION_RUNS
+
+
+def apply_strategy(strategy, gray, dst=None):
+    """Binarize gray with one strategy (optionally into dst)"""
+    if strategy.method == OTSU:
+        return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=dst)[1]
+    adaptive = cv2.ADAPTIVE_THRESH_GAUSSIAN_C if strategy.method == ADAPTIVE_GAUSSIAN else cv2.ADAPTIVE_THRESH_MEAN_C
+    return cv2.adaptiveThreshold(gray, 255, adaptive, cv2.THRESH_BINARY, strategy.block_size, strategy.c, dst=dst)
+
+
+class ThresholdTuner:
+    """Learns which threshold strategies work for the current batch"""
+
+    def __init__(self, calibration_runs=CALIBRATION_RUNS, keep=KEEP_STRATEGIES,
+                 window=RECALIBRATE_WINDOW, recalibrate_below=RECALIBRATE_BELOW):
+        self.calibration_runs = calibration_runs
+        self.keep = keep
+        self.recalibrate_below = recalibrate_below
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.calibrations = 0
+        self._start_calibration()
+
+    def _start_calibration(self):
+        self.calibrating = True
+        self.calibrations += 1
+        self._runs = 0
+        self._successes = {strategy.name: 0 for strategy in STRATEGY_GRID}
+        self._seconds = {strategy.name: 0.0 for strategy in STRATEGY_GRID}
+        self._ladder = list(STRATEGY_GRID)
+        self._recent.clear()
+
+    def ladder(self):
+        """Strategies to try for the next run, in order"""
+        with self._lock:
+            return list(self._ladder)
+
+    def record(self, strategy, success, seconds):
+        """Record one strategy attempt during calibration"""
+        with self._lock:
+            if self.calibrating and strategy.name in self._successes:
+                self._successes[strategy.name] += int(success)
+                self._seconds[strategy.name] += seconds
+
+    def finish_run(self, success):
+        """Close one ladder run; ends calibration or triggers recalibration"""
+        with self._lock:
+            if self.calibrating:
+                self._runs += 1
+                if self._runs >= self.calibration_runs:
+                    self._finish_calibration()
+                return
+            self._recent.append(bool(success))
+            if (len(self._recent) == self._recent.maxlen
+                    and sum(self._recent) / len(self._recent) < self.recalibrate_below):
+                self._start_calibration()
+
+    def _finish_calibration(self):
+        working = [s for s in STRATEGY_GRID if self._successes[s.name]]
+        # Most decodes first; ties go to the faster strategy
+        working.sort(key=lambda s: (-self._successes[s.name], self._seconds[s.name]))
+        self._ladder = working[:self.keep] or list(DEFAULT_LADDER)
+        self.calibrating = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calibrating': self.calibrating,
+                'calibrations': self.calibrations,
+                'ladder': [strategy.name for strategy in self._ladder],
+                'recent_hit_rate': round(sum(self._recent) / len(self._recent), 3) if self._recent else None,
+            }
+
+
+def tuner_for_batch(file_count):
+    """A fresh ThresholdTuner for a batch big enough to calibrate on, else None"""
+    return ThresholdTuner() if file_count >= MIN_TUNED_BATCH else None
+
+
+def run_threshold_ladder(gray, decode, tuner=None, dst=None, on_win=None, stats=None):
+    """Threshold gray with each strategy and return the first truthy decode(binary)
+
+    While the tuner calibrates every strategy in the grid is tried (and
+    timed) even after a success, so the whole grid gets scored.
+    on_win(strategy) is called with the strategy that produced the result.
+    stats (StrategyStats) records every attempt and may skip strategies
+    (never during calibration).
+    """
+    if tuner is None:
+        for strategy in DEFAULT_LADDER:
+            if stats is not None and stats.should_skip(strategy.name):
+                continue
+            started = time.perf_counter()
+            result = decode(apply_strategy(strategy, gray, dst))
+            if stats is not None:
+                stats.record(strategy.name, bool(result), time.perf_counter() - started)
+            if result:
+                if on_win is not None:
+                    on_win(strategy)
+                return result
+        return None
+
+    calibrating = tuner.calibrating
+    found = None
+    for strategy in tuner.ladder():
+        if stats is not None and not calibrating and stats.should_skip(strategy.name):
+            continue
+        started = time.perf_counter()
+        result = decode(apply_strategy(strategy, gray, dst))
+        seconds = time.perf_counter() - started
+        tuner.record(strategy, bool(result), seconds)
+        if stats is not None:
+            stats.record(strategy.name, bool(result), seconds)
+        if result and found is None:
+            found = result
+            if on_win is not None:
+                on_win(strategy)
+            if not calibrating:
+                break
+    tuner.finish_run(found is not None)
+    return found
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batched zxing decoding
+ตัวอ่าน barcode ด้วย zxing แบบส่งไฟล์เป็นชุด เรียก JVM หนึ่งครั้งต่อหนึ่งชุด
+
+pyzxing.BarCodeReader.decode starts a new JVM for every file, and JVM startup
+dominates the per-image cost. ZXingWorker decodes each batch of file paths
+with a single `java -jar zxing.jar file1 file2 ...` invocation straight from
+the calling thread, so JVM startup is paid once per batch instead of once per
+image. zxing's CommandLineRunner only takes files on the command line (it
+cannot be fed from stdin), so one JVM per batch is as far as it goes without
+a Java-side server. A JVM that fails or hangs is retried once per batch.
+"""
+
+import os
+import logging
+import subprocess
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+
+DEFAULT_BATCH_SIZE = 64
+BATCH_TIMEOUT = 120.0  # seconds per batch before the JVM is considered hung
+
+logger = logging.getLogger(__name__)
+
+
+def find_zxing_jar():
+    """Locate the zxing jar bundled with pyzxing (downloads it on first use)"""
+    from pyzxing import BarCodeReader
+    return BarCodeReader().lib_path
+
+
+def _uri_to_key(uri):
+    """file:///C:/a%20b.jpg -> normalized local path"""
+    parsed = urlparse(uri)
+    path = unquote(parsed.path)
+    if os.name == 'nt' and path.startswith('/') and len(path) > 2 and path[2] == ':':
+        path = path[1:]
+    return os.path.normcase(os.path.abspath(path))
+
+
+def parse_zxing_output(output):
+    """Parse CommandLineRunner output into {normalized_path: text or None}"""
+    results = {}
+    current = None
+    in_raw = False
+    raw_lines = []
+
+    for line in output.splitlines():
+        if line.startswith('file:'):
+            if current is not None and in_raw:
+                results[current] = '\n'.join(raw_lines).strip() or None
+            in_raw = False
+            raw_lines = []
+            if ': No barcode found' in line:
+                results[_uri_to_key(line.split(': No barcode found')[0])] = None
+                current = None
+            elif ' (format:' in line:
+                current = _uri_to_key(line.split(' (format:')[0])
+            else:
+                current = None
+        elif current is not None and line.startswith('Raw result:'):
+            in_raw = True
+        elif current is not None and in_raw and line.startswith('Parsed result:'):
+            if current not in results:
+                results[current] = '\n'.join(raw_lines).strip() or None
+            in_raw = False
+            current = None
+        elif in_raw:
+            raw_lines.append(line)
+
+    if current is not None and in_raw and current not in results:
+        results[current] = '\n'.join(raw_lines).strip() or None
+    return results
+
+
+def decode_with_jvm(file_paths, jar_path, java='java', try_harder=False):
+    """Decode many files with a single JVM invocation"""
+    uris = [Path(p).resolve().as_uri() for p in file_paths]
+    cmd = [java, '-jar', jar_path] + uris
+    if try_harder:
+        cmd.append('--try_harder')
+    completed = subprocess.run(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=BATCH_TIMEOUT,
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0),
+    )
+    # A crashed JVM (missing jar, OOM, ...) must not look like "no barcode found"
+    stderr = completed.stderr.decode('utf-8', errors='replace').strip()
+    if completed.returncode != 0:
+        raise RuntimeError(f"zxing exited with code {completed.returncode}: {stderr[-200:]}")
+    parsed = parse_zxing_output(completed.stdout.decode('utf-8', errors='replace'))
+    if file_paths and not parsed:
+        raise RuntimeError(f"zxing reported no result for any file: {stderr[-200:]}")
+    return {p: parsed.get(os.path.normcase(os.path.abspath(p))) for p in file_paths}
+
+
+class ZXingWorker:
+    """Decodes batches of files with one zxing JVM per batch"""
+
+    def __init__(self, jar_path=None, java='java', try_harder=False, batch_size=DEFAULT_BATCH_SIZE):
+        self.jar_path = jar_path or find_zxing_jar()
+        self.java = java
+        self.try_harder = try_harder
+        self.batch_size = batch_size
+        self.retries = 0
+
+    def _request(self, batch):
+        try:
+            return decode_with_jvm(batch, self.jar_path, self.java, self.try_harder)
+        except subprocess.TimeoutExpired as e:
+            raise TimeoutError("zxing did not answer in time") from e
+
+    def decode_batch(self, file_paths):
+        """Decode files; returns {path: barcode_text or None}
+
+        Raises RuntimeError when a batch still fails after a retry
+        (for example when Java is not installed).
+        """
+        results = {}
+        file_paths = list(file_paths)
+        for start in range(0, len(file_paths), self.batch_size):
+            batch = file_paths[start:start + self.batch_size]
+            try:
+                results.update(self._request(batch))
+            except (OSError, TimeoutError, RuntimeError) as e:
+                # Crashed or hung JVM: retry the batch once
+                logger.warning(f"zxing batch retried: {type(e).__name__}: {str(e)[:100]}")
+                self.retries += 1
+                try:
+                    results.update(self._request(batch))
+                except (OSError, TimeoutError, RuntimeError) as retry_error:
+                    raise RuntimeError(f"zxing failed: {retry_error}") from retry_error
+        return results
+
+    def decode(self, file_path):
+        """Decode a single file"""
+        return self.decode_batch([file_path]).get(file_path)